@@ -0,0 +1,28 @@
+"""Add activity keyset pagination index
+
+Revision ID: 0b6f2c8e4d71
+Revises: a7d3e58c2b94
+Create Date: 2026-10-18 16:48:12.660193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b6f2c8e4d71'
+down_revision: Union[str, Sequence[str], None] = 'a7d3e58c2b94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_activities_user_id_date_id', 'activities', ['user_id', 'date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_activities_user_id_date_id', table_name='activities')
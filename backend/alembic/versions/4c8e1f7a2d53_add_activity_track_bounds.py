@@ -0,0 +1,39 @@
+"""Add activity track bounds
+
+Revision ID: 4c8e1f7a2d53
+Revises: 9f4b2d6e1a85
+Create Date: 2026-10-18 19:12:27.518340
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8e1f7a2d53'
+down_revision: Union[str, Sequence[str], None] = '9f4b2d6e1a85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    Existing tracks get their bounds from ``manage.py compute-metrics``.
+    """
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.add_column(sa.Column('min_lat', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('min_lng', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('max_lat', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('max_lng', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.drop_column('max_lng')
+        batch_op.drop_column('max_lat')
+        batch_op.drop_column('min_lng')
+        batch_op.drop_column('min_lat')
@@ -0,0 +1,76 @@
+"""Add numeric duration and pace
+
+Revision ID: 5e0a9d3b7f16
+Revises: c41e7b92a5f8
+Create Date: 2026-10-18 15:10:51.204388
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0a9d3b7f16'
+down_revision: Union[str, Sequence[str], None] = 'c41e7b92a5f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _parse(parser, text):
+    if not text:
+        return None
+    try:
+        return parser(text)
+    except ValueError:
+        return None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    Existing time/pace strings are parsed in batches and written back with
+    one executemany UPDATE per batch. Strings that can't be parsed are left
+    NULL.
+    """
+    from formatting import pace_seconds_per_km, parse_duration, parse_pace
+
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.add_column(sa.Column('duration_seconds', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('pace_seconds_per_km', sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    update = sa.text(
+        "UPDATE activities SET duration_seconds = :duration, pace_seconds_per_km = :pace WHERE id = :id"
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text(
+                "SELECT id, distance, time, pace FROM activities "
+                "WHERE id > :last_id AND (time IS NOT NULL OR pace IS NOT NULL) ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+
+        params = []
+        for activity_id, distance, time, pace in rows:
+            duration = _parse(parse_duration, time)
+            pace_seconds = _parse(parse_pace, pace)
+            if pace_seconds is None:
+                pace_seconds = pace_seconds_per_km(distance, duration)
+            params.append({"id": activity_id, "duration": duration, "pace": pace_seconds})
+        bind.execute(update, params)
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.drop_column('pace_seconds_per_km')
+        batch_op.drop_column('duration_seconds')
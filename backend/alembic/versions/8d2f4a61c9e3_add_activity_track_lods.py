@@ -0,0 +1,42 @@
+"""Add activity track levels of detail
+
+Revision ID: 8d2f4a61c9e3
+Revises: 3b9e51c0d7a2
+Create Date: 2026-10-18 13:05:42.501876
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f4a61c9e3'
+down_revision: Union[str, Sequence[str], None] = '3b9e51c0d7a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('activity_track_lods',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('level', sa.String(), nullable=False),
+    sa.Column('tolerance', sa.Float(), nullable=False),
+    sa.Column('point_count', sa.Integer(), nullable=False),
+    sa.Column('track_data', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activities.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('activity_id', 'level')
+    )
+    op.create_index(op.f('ix_activity_track_lods_activity_id'), 'activity_track_lods', ['activity_id'], unique=False)
+    op.create_index(op.f('ix_activity_track_lods_id'), 'activity_track_lods', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_activity_track_lods_id'), table_name='activity_track_lods')
+    op.drop_index(op.f('ix_activity_track_lods_activity_id'), table_name='activity_track_lods')
+    op.drop_table('activity_track_lods')
@@ -0,0 +1,30 @@
+"""Add per-user data version for ETags
+
+Revision ID: 9f4b2d6e1a85
+Revises: e2c97a4f1b38
+Create Date: 2026-10-18 18:05:41.302517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f4b2d6e1a85'
+down_revision: Union[str, Sequence[str], None] = 'e2c97a4f1b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,93 @@
+"""Add activity rollups
+
+Revision ID: a7d3e58c2b94
+Revises: 5e0a9d3b7f16
+Create Date: 2026-10-18 16:02:37.918240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e58c2b94'
+down_revision: Union[str, Sequence[str], None] = '5e0a9d3b7f16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    The new tables are filled from existing activities with the SQL below;
+    ``manage.py rebuild-rollups`` recomputes them the same way later on.
+    """
+    op.create_table('activity_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('activity_count', sa.Integer(), nullable=False),
+    sa.Column('distance', sa.Float(), nullable=False),
+    sa.Column('duration_seconds', sa.Integer(), nullable=False),
+    sa.Column('timed_distance', sa.Float(), nullable=False),
+    sa.Column('active_days', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'period', 'period_start')
+    )
+    op.create_table('activity_route_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('route', sa.String(), nullable=False),
+    sa.Column('activity_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'year', 'route')
+    )
+
+    # Backfill from activities, bucketed by UTC day
+    if op.get_bind().dialect.name == 'postgresql':
+        day = """("date" AT TIME ZONE 'UTC')::date"""
+        starts = {
+            'day': day,
+            'month': f"date_trunc('month', {day})::date",
+            'year': f"date_trunc('year', {day})::date",
+        }
+        year = f"CAST(EXTRACT(YEAR FROM {day}) AS INTEGER)"
+    else:
+        day = 'date("date")'
+        starts = {
+            'day': day,
+            'month': """date("date", 'start of month')""",
+            'year': """date("date", 'start of year')""",
+        }
+        year = """CAST(strftime('%Y', "date") AS INTEGER)"""
+    for period, start in starts.items():
+        op.execute(f"""
+            INSERT INTO activity_rollups
+                (user_id, period, period_start, activity_count, distance,
+                 duration_seconds, timed_distance, active_days)
+            SELECT user_id, '{period}', {start}, COUNT(*), SUM(distance),
+                   COALESCE(SUM(duration_seconds), 0),
+                   COALESCE(SUM(CASE WHEN duration_seconds IS NOT NULL THEN distance END), 0),
+                   COUNT(DISTINCT {day})
+            FROM activities
+            GROUP BY user_id, {start}
+        """)
+    op.execute(f"""
+        INSERT INTO activity_route_rollups (user_id, year, route, activity_count)
+        SELECT user_id, {year}, route, COUNT(*)
+        FROM activities
+        WHERE route IS NOT NULL AND route != ''
+        GROUP BY user_id, {year}, route
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('activity_route_rollups')
+    op.drop_table('activity_rollups')
@@ -0,0 +1,30 @@
+"""Add activity track version
+
+Revision ID: b5f83d1c6e27
+Revises: 4c8e1f7a2d53
+Create Date: 2026-10-18 21:40:12.604318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5f83d1c6e27'
+down_revision: Union[str, Sequence[str], None] = '4c8e1f7a2d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.add_column(sa.Column('track_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.drop_column('track_version')
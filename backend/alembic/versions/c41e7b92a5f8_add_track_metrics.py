@@ -0,0 +1,49 @@
+"""Add derived track metrics
+
+Revision ID: c41e7b92a5f8
+Revises: 8d2f4a61c9e3
+Create Date: 2026-10-18 14:22:09.734115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7b92a5f8'
+down_revision: Union[str, Sequence[str], None] = '8d2f4a61c9e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    Existing tracks are measured afterwards with ``manage.py compute-metrics``.
+    """
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.add_column(sa.Column('track_distance', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('elevation_gain', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('elevation_loss', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('elapsed_seconds', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('moving_seconds', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('splits', sa.JSON(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_activities_track_distance'), ['track_distance'], unique=False)
+        batch_op.create_index(batch_op.f('ix_activities_elevation_gain'), ['elevation_gain'], unique=False)
+        batch_op.create_index(batch_op.f('ix_activities_moving_seconds'), ['moving_seconds'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_activities_moving_seconds'))
+        batch_op.drop_index(batch_op.f('ix_activities_elevation_gain'))
+        batch_op.drop_index(batch_op.f('ix_activities_track_distance'))
+        batch_op.drop_column('splits')
+        batch_op.drop_column('moving_seconds')
+        batch_op.drop_column('elapsed_seconds')
+        batch_op.drop_column('elevation_loss')
+        batch_op.drop_column('elevation_gain')
+        batch_op.drop_column('track_distance')
@@ -0,0 +1,34 @@
+"""Add activity type date range index
+
+Revision ID: e2c97a4f1b38
+Revises: 0b6f2c8e4d71
+Create Date: 2026-10-18 17:31:45.085512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2c97a4f1b38'
+down_revision: Union[str, Sequence[str], None] = '0b6f2c8e4d71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    (user_id, date, id) from the previous revision already serves user_id
+    lookups and plain date ranges; this one covers ranges within a type.
+    """
+    op.create_index(
+        'ix_activities_user_id_activity_type_date', 'activities', ['user_id', 'activity_type', 'date'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_activities_user_id_activity_type_date', table_name='activities')
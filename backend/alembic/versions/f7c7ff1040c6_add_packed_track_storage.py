@@ -0,0 +1,72 @@
+"""Add packed track storage to activities
+
+Revision ID: f7c7ff1040c6
+Revises: 19c807656dd7
+Create Date: 2026-10-18 09:12:05.311482
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7c7ff1040c6'
+down_revision: Union[str, Sequence[str], None] = '19c807656dd7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.add_column(sa.Column('track_data', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('track_points', sa.Integer(), nullable=True))
+
+    # Backfill point counts for tracks already stored as rows
+    op.execute(
+        "UPDATE activities SET track_points = ("
+        "SELECT COUNT(*) FROM activity_routes WHERE activity_routes.activity_id = activities.id)"
+    )
+    op.create_index(op.f('ix_activity_routes_activity_id'), 'activity_routes', ['activity_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema.
+
+    Packed tracks are unpacked back into activity_routes rows before the
+    column is dropped, so no track data is lost.
+    """
+    from tracks.codec import decode_track
+
+    bind = op.get_bind()
+    activity_routes = sa.table(
+        'activity_routes',
+        sa.column('activity_id', sa.Integer),
+        sa.column('latitude', sa.Float),
+        sa.column('longitude', sa.Float),
+        sa.column('elevation', sa.Float),
+        sa.column('timestamp', sa.DateTime),
+        sa.column('order_index', sa.Integer),
+    )
+    packed = bind.execute(sa.text("SELECT id, track_data FROM activities WHERE track_data IS NOT NULL")).fetchall()
+    for activity_id, blob in packed:
+        rows = [
+            {
+                'activity_id': activity_id,
+                'latitude': point['lat'],
+                'longitude': point['lng'],
+                'elevation': point['elevation'],
+                'timestamp': point['timestamp'],
+                'order_index': i,
+            }
+            for i, point in enumerate(decode_track(blob).to_coordinates())
+        ]
+        if rows:
+            bind.execute(activity_routes.insert(), rows)
+
+    op.drop_index(op.f('ix_activity_routes_activity_id'), table_name='activity_routes')
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.drop_column('track_points')
+        batch_op.drop_column('track_data')
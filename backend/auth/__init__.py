@@ -1,14 +1,18 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from schemas import User, TokenData
 from models import User as UserModel
-from database import get_db
+from database import get_async_db
 from config import settings
+from cache import MemoryBackend, ResponseCache
 
 # Password hashing - using argon2 instead of bcrypt
 pwd_context = None
@@ -16,46 +20,91 @@ pwd_context = None
 def get_pwd_context():
     global pwd_context
     if pwd_context is None:
-        # Use argon2 which is more secure and avoids bcrypt issues
+        # Use argon2 which is more secure and avoids bcrypt issues.
+        # Hashes made with other costs are flagged by needs_update and
+        # replaced on the user's next login.
         pwd_context = CryptContext(
             schemes=["argon2"], 
-            deprecated="auto"
+            deprecated="auto",
+            argon2__rounds=settings.ARGON2_TIME_COST,
+            argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+            argon2__parallelism=settings.ARGON2_PARALLELISM
         )
     return pwd_context
 
+# Every argon2 hash or verify runs here: the pool size caps the CPU and
+# memory (ARGON2_MEMORY_COST each) they take at once, and argon2 releases
+# the GIL so other requests keep running meanwhile.
+password_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
+# Resolved users by id, so authenticating a request usually costs no query.
+# Entries are schemas.User snapshots (no password hash, no data_version) and
+# are dropped by invalidate_principal when a user changes. That only reaches
+# this process: elsewhere a changed or deactivated user is served from cache
+# until the entry expires, at most AUTH_CACHE_TTL_SECONDS (capped at 300).
+principal_cache = ResponseCache(MemoryBackend(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL_SECONDS))
+
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop."""
     context = get_pwd_context()
-    return context.verify(plain_password, hashed_password)
+    return await asyncio.get_running_loop().run_in_executor(password_executor, context.hash, password)
+
 
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password without blocking the event loop.
 
-def get_password_hash(password: str) -> str:
-    """Hash a password."""
+    Returns whether it matched and, when the hash was made with other
+    costs than the configured ones, a new hash to store.
+    """
     context = get_pwd_context()
-    return context.hash(password)
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, context.verify_and_update, plain_password, hashed_password
+    )
 
 
-def get_user_by_email(db: Session, email: str) -> Optional[UserModel]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[UserModel]:
     """Get user by email."""
-    return db.query(UserModel).filter(UserModel.email == email).first()
+    return await db.scalar(select(UserModel).where(UserModel.email == email).limit(1))
 
 
-def get_user_by_username(db: Session, username: str) -> Optional[UserModel]:
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[UserModel]:
     """Get user by username."""
-    return db.query(UserModel).filter(UserModel.username == username).first()
+    return await db.scalar(select(UserModel).where(UserModel.username == username).limit(1))
+
 
+async def get_principal(db: AsyncSession, user_id: int) -> Optional[User]:
+    """The user with ``user_id`` from ``principal_cache``, loaded by primary key on a miss."""
+    async def load() -> Optional[User]:
+        user = await db.get(UserModel, user_id)
+        return User.model_validate(user) if user is not None else None
+    
+    return await principal_cache.get_or_set_async((user_id,), load)
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[UserModel]:
-    """Authenticate a user."""
-    user = get_user_by_username(db, username)
+
+def invalidate_principal(user_id: int) -> None:
+    """Forget a cached user; call after changing or deactivating them."""
+    principal_cache.invalidate(user_id)
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[UserModel]:
+    """Authenticate a user, rehashing their password if the argon2 costs changed.
+
+    Queries are awaited and argon2 runs in ``password_executor``, so a
+    burst of logins doesn't stall the event loop.
+    """
+    user = await get_user_by_username(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
@@ -72,7 +121,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get the current authenticated user."""
     credentials_exception = HTTPException(
@@ -89,7 +138,12 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_username(db, username=token_data.username)
+    user_id = payload.get("uid")
+    if isinstance(user_id, int):
+        user = await get_principal(db, user_id)
+    else:
+        # Tokens issued before they carried the user id
+        user = await get_user_by_username(db, username=token_data.username)
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Batch activity creation benchmark.
+Compares activities/sec of N single POST /activities/ calls against one
+POST /activities/batch carrying the same N activities.
+
+Usage:
+    python benchmarks/bench_batch_create.py --activities 1000 --points 100
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from database import get_db
+from models import Base
+
+
+def make_activity(i: int, points: int):
+    return {
+        "date": f"2024-01-{i % 28 + 1:02d}T10:00:00",
+        "distance": 5.0,
+        "time": "30m",
+        "route": f"Route {i % 20}",
+        "activity_type": "run",
+        "coordinates": [
+            {"lat": 40.7128 + p * 1e-4, "lng": -74.0060 + p * 1e-4, "elevation": 10.0}
+            for p in range(points)
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--activities", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=100)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        client = TestClient(app)
+        client.post("/api/v1/users/", json={
+            "email": "bench@example.com", "username": "bench", "password": "bench123"
+        })
+        token = client.post("/api/v1/auth/login", data={"username": "bench", "password": "bench123"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        activities = [make_activity(i, args.points) for i in range(args.activities)]
+
+        started = time.perf_counter()
+        for activity in activities:
+            assert client.post("/api/v1/activities/", json=activity, headers=headers).status_code == 201
+        single = args.activities / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        response = client.post("/api/v1/activities/batch", json={"activities": activities}, headers=headers)
+        assert response.json()["created"] == args.activities
+        batch = args.activities / (time.perf_counter() - started)
+
+        print(f"Activity creation benchmark ({args.activities} activities x {args.points} points)")
+        print(f"   single POST /activities/:     {single:>10,.0f} activities/sec  {single * args.points:>12,.0f} points/sec")
+        print(f"   POST /activities/batch:       {batch:>10,.0f} activities/sec  {batch * args.points:>12,.0f} points/sec")
+        print(f"   speedup:                      {batch / single:>10.1f}x")
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == "__main__":
+    main()
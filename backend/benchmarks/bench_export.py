@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Activity export benchmark.
+Streams the body of GET /activities/export?include=coordinates for a user
+with many tracked activities and reports time to first byte, total time
+and peak Python memory. The generator is driven directly, since the test
+client buffers whole responses; memory is traced in a second pass so
+tracing doesn't skew the timings.
+
+Usage:
+    python benchmarks/bench_export.py --activities 2000 --points 500
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# The export opens its own sessions, so point the app at the scratch database up front
+db_fd, db_path = tempfile.mkstemp(suffix=".db")
+os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from main import app
+from database import engine
+from models import Activity as ActivityModel, ActivityType, Base
+from routers.activities import export_lines
+from tracks.codec import Track, encode_track
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--activities", type=int, default=2000)
+    parser.add_argument("--points", type=int, default=500)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    try:
+        client = TestClient(app)
+        user = client.post("/api/v1/users/", json={
+            "email": "bench@example.com", "username": "bench", "password": "bench123"
+        }).json()
+
+        steps = np.arange(args.points) * 1e-4
+        blob = encode_track(Track(40.7 + steps, -74.0 + steps))
+        start = datetime(2010, 1, 1)
+        with engine.begin() as conn:
+            conn.execute(insert(ActivityModel), [
+                {
+                    "user_id": user["id"],
+                    "date": start + timedelta(days=i),
+                    "distance": 5.0,
+                    "activity_type": ActivityType.RUN,
+                    "track_points": args.points,
+                    "track_data": blob,
+                }
+                for i in range(args.activities)
+            ])
+
+        started = time.perf_counter()
+        first_byte = None
+        size = 0
+        for chunk in export_lines(user["id"], coordinates=True):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+        total = time.perf_counter() - started
+
+        tracemalloc.start()
+        for chunk in export_lines(user["id"], coordinates=True):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"Export benchmark ({args.activities:,} activities x {args.points:,} points)")
+        print(f"   first byte  {first_byte * 1000:>8.1f}ms")
+        print(f"   total       {total:>8.2f}s  ({size / 1e6:,.1f} MB of NDJSON)")
+        print(f"   peak memory {peak / 1e6:>8.1f} MB")
+    finally:
+        engine.dispose()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Activity list pagination benchmark.
+Compares GET /activities/ page latency at increasing depths for offset
+paging (?skip=) against keyset paging (?cursor=).
+
+Usage:
+    python benchmarks/bench_pagination.py --activities 200000 --limit 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from database import get_db
+from models import Activity as ActivityModel, ActivityType, Base
+from routers.activities import encode_cursor
+
+
+def timed_get(client, url, headers, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        best = min(best, time.perf_counter() - started)
+        assert response.status_code == 200
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--activities", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        client = TestClient(app)
+        user = client.post("/api/v1/users/", json={
+            "email": "bench@example.com", "username": "bench", "password": "bench123"
+        }).json()
+        token = client.post("/api/v1/auth/login", data={"username": "bench", "password": "bench123"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        start = datetime(2010, 1, 1)
+        with engine.begin() as conn:
+            conn.execute(insert(ActivityModel), [
+                {
+                    "user_id": user["id"],
+                    "date": start + timedelta(hours=6 * i),
+                    "distance": 5.0,
+                    "activity_type": ActivityType.RUN,
+                    "track_points": 0,
+                }
+                for i in range(args.activities)
+            ])
+
+        db = SessionLocal()
+        ordered = db.query(ActivityModel).order_by(ActivityModel.date.desc(), ActivityModel.id.desc())
+
+        print(f"Pagination benchmark ({args.activities:,} activities, {args.limit} per page, best of 5)")
+        print(f"   {'depth':>10}  {'offset':>10}  {'cursor':>10}")
+        for depth in (0, args.activities // 100, args.activities // 10, args.activities // 2, args.activities - args.limit):
+            offset_ms = timed_get(client, f"/api/v1/activities/?limit={args.limit}&skip={depth}", headers)
+            if depth:
+                cursor = encode_cursor(ordered.offset(depth - 1).first())
+                cursor_ms = timed_get(client, f"/api/v1/activities/?limit={args.limit}&cursor={cursor}", headers)
+            else:
+                cursor_ms = timed_get(client, f"/api/v1/activities/?limit={args.limit}", headers)
+            print(f"   {depth:>10,}  {offset_ms:>8.1f}ms  {cursor_ms:>8.1f}ms")
+        db.close()
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Route insert benchmark.
+Compares points/sec of the legacy one-ORM-object-per-point path against the
+bulk executemany path used by create_activity/update_activity.
+
+Usage:
+    python benchmarks/bench_route_insert.py --points 10000 --runs 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Activity as ActivityModel, ActivityRoute as ActivityRouteModel, ActivityType, User as UserModel
+from tracks.storage import insert_route_coordinates
+from schemas import ActivityRouteCoordinate
+
+
+def make_track(points: int):
+    start = datetime(2024, 1, 15, 8, 0, 0)
+    return [
+        ActivityRouteCoordinate(
+            lat=40.7128 + i * 1e-5,
+            lng=-74.0060 + i * 1e-5,
+            elevation=10.0 + (i % 50) * 0.1,
+            timestamp=start + timedelta(seconds=i),
+        )
+        for i in range(points)
+    ]
+
+
+def legacy_insert(db, activity_id, coordinates):
+    """The pre-bulk path: one ORM object and db.add() per point, two commits."""
+    db.commit()
+    for i, coord in enumerate(coordinates):
+        db.add(ActivityRouteModel(
+            activity_id=activity_id,
+            latitude=coord.lat,
+            longitude=coord.lng,
+            elevation=coord.elevation,
+            timestamp=coord.timestamp,
+            order_index=i
+        ))
+    db.commit()
+
+
+def bulk_insert(db, activity_id, coordinates):
+    insert_route_coordinates(db, activity_id, coordinates)
+    db.commit()
+
+
+def run(SessionLocal, user_id, coordinates, insert_fn, runs):
+    best = float("inf")
+    for _ in range(runs):
+        db = SessionLocal()
+        try:
+            activity = ActivityModel(
+                user_id=user_id,
+                date=datetime(2024, 1, 15, 8, 0, 0),
+                distance=10.0,
+                activity_type=ActivityType.CYCLING
+            )
+            db.add(activity)
+            db.flush()
+            started = time.perf_counter()
+            insert_fn(db, activity.id, coordinates)
+            best = min(best, time.perf_counter() - started)
+        finally:
+            db.close()
+    return len(coordinates) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    try:
+        engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = SessionLocal()
+        user = UserModel(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        db.close()
+
+        coordinates = make_track(args.points)
+        legacy = run(SessionLocal, user_id, coordinates, legacy_insert, args.runs)
+        bulk = run(SessionLocal, user_id, coordinates, bulk_insert, args.runs)
+
+        print(f"Route insert benchmark ({args.points} points, best of {args.runs})")
+        print(f"   legacy ORM add():   {legacy:>12,.0f} points/sec")
+        print(f"   bulk executemany:   {bulk:>12,.0f} points/sec")
+        print(f"   speedup:            {bulk / legacy:>12.1f}x")
+        engine.dispose()
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Activity serialization benchmark.
+Compares rows/sec for turning activities into a JSON body the old way
+(ORM rows validated into schemas.Activity, then dumped by Pydantic, as
+FastAPI does for response_model) against the fast path (row tuples encoded
+with orjson by serialization.activity_dicts). Both end-to-end (query +
+encode) and encode-only numbers are reported.
+
+Usage:
+    python benchmarks/bench_serialization.py --activities 20000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from models import Activity as ActivityModel, ActivityType, Base, User as UserModel
+from schemas import Activity
+from serialization import ACTIVITY_FIELDS, activity_columns, activity_dicts, dumps
+
+
+def best_of(action, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--activities", type=int, default=20000)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    try:
+        with engine.begin() as conn:
+            user_id = conn.execute(insert(UserModel).values(
+                email="bench@example.com", username="bench", hashed_password="x"
+            )).inserted_primary_key[0]
+            start = datetime(2010, 1, 1, 6, 30)
+            conn.execute(insert(ActivityModel), [
+                {
+                    "user_id": user_id,
+                    "date": start + timedelta(hours=7 * i),
+                    "distance": 5.0 + i % 10,
+                    "pace": "5'20\"/km",
+                    "bpm": 150,
+                    "time": "26m 40s",
+                    "route": f"Route {i % 25}",
+                    "activity_type": ActivityType.RUN,
+                    "duration_seconds": 1600,
+                    "pace_seconds_per_km": 320,
+                    "track_distance": 5.01,
+                    "elevation_gain": 42.0,
+                    "elevation_loss": 40.5,
+                    "elapsed_seconds": 1600,
+                    "moving_seconds": 1580,
+                    "splits": [318.2, 321.0, 319.9, 322.4, 318.5],
+                    "track_points": 0,
+                }
+                for i in range(args.activities)
+            ])
+
+        adapter = TypeAdapter(List[Activity])
+        db = SessionLocal()
+
+        def query_models():
+            db.expunge_all()
+            return db.query(ActivityModel).filter(ActivityModel.user_id == user_id).all()
+
+        def query_rows():
+            return db.query(*activity_columns(ACTIVITY_FIELDS)).filter(ActivityModel.user_id == user_id).all()
+
+        def pydantic_encode(rows):
+            return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+        def orjson_encode(rows):
+            return dumps(list(activity_dicts(rows, ACTIVITY_FIELDS)))
+
+        models = query_models()
+        rows = query_rows()
+        assert pydantic_encode(models) == orjson_encode(rows)
+
+        results = [
+            ("ORM + Pydantic", best_of(lambda: pydantic_encode(query_models())), best_of(lambda: pydantic_encode(models))),
+            ("rows + orjson", best_of(lambda: orjson_encode(query_rows())), best_of(lambda: orjson_encode(rows))),
+        ]
+        db.close()
+
+        n = args.activities
+        print(f"Serialization benchmark ({n:,} activities, best of 3)")
+        print(f"   {'path':<16}  {'query + encode':>16}  {'encode only':>16}")
+        for name, total, encode in results:
+            print(f"   {name:<16}  {n / total:>10,.0f} rows/s  {n / encode:>10,.0f} rows/s")
+    finally:
+        engine.dispose()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == "__main__":
+    main()
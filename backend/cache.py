@@ -0,0 +1,148 @@
+"""Response cache for the per-user stats endpoints.
+
+Entries are serialized JSON bodies keyed by ``(user_id, data_version,
+endpoint, params...)``. The data version (see ``etags.py``) makes a write
+invisible to stale entries even when it happens in another process, such
+as an import worker; writers in the API process also call
+``stats_cache.invalidate(user_id)`` after committing so dead entries free
+their slot right away instead of waiting to be evicted.
+
+Storage is pluggable: a backend implements ``get``/``set``/``invalidate``
+(see ``CacheBackend``) and is picked with ``STATS_CACHE_BACKEND``. The
+default ``memory`` backend is an in-process LRU with a TTL; ``none``
+disables caching.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Protocol, Set, Tuple
+
+from config import settings
+
+CacheKey = Tuple[Hashable, ...]  # the user id comes first
+
+
+class CacheBackend(Protocol):
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        """The cached body, or None on a miss or an expired entry."""
+
+    def set(self, key: CacheKey, value: bytes) -> None:
+        ...
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop every entry of ``user_id``."""
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries: "OrderedDict[CacheKey, Tuple[float, bytes]]" = OrderedDict()
+        self._keys_by_user: Dict[Hashable, Set[CacheKey]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: CacheKey, value: bytes) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._keys_by_user.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            for key in self._keys_by_user.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def _remove(self, key: CacheKey) -> None:
+        del self._entries[key]
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class NullBackend:
+    """Caches nothing."""
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        return None
+
+    def set(self, key: CacheKey, value: bytes) -> None:
+        pass
+
+    def invalidate(self, user_id: int) -> None:
+        pass
+
+
+BACKENDS: Dict[str, Callable[[], CacheBackend]] = {
+    "memory": lambda: MemoryBackend(settings.STATS_CACHE_MAX_ENTRIES, settings.STATS_CACHE_TTL_SECONDS),
+    "none": NullBackend,
+}
+
+
+class ResponseCache:
+    """Counts hits and misses in front of a ``CacheBackend``."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get_or_set_async(self, key: CacheKey, build: Callable[[], Awaitable[bytes]]) -> bytes:
+        """The cached body for ``key``, awaiting ``build()`` to fill it on a miss.
+
+        A None from ``build`` is returned but not cached.
+        """
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = await build()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    def invalidate(self, user_id: int) -> None:
+        self.invalidations += 1
+        self.backend.invalidate(user_id)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        metrics = {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+        }
+        if isinstance(self.backend, MemoryBackend):
+            metrics.update(entries=len(self.backend), evictions=self.backend.evictions)
+        return metrics
+
+
+stats_cache = ResponseCache(BACKENDS[settings.STATS_CACHE_BACKEND]())
@@ -1,20 +1,80 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: str = "sqlite:///./visual_bio.db"
     POSTGRES_URL: Optional[str] = None
+    # Optional read replica for read-only endpoints, and how long a user's reads
+    # stay on the primary after they write, to cover replication lag
+    READ_DATABASE_URL: Optional[str] = None
+    READ_STICKINESS_SECONDS: float = 5.0
+    # SQLite pragmas applied to every new connection. WAL lets readers run alongside a
+    # writer; busy_timeout makes a blocked writer wait instead of failing with
+    # "database is locked". MMAP in bytes, cache in pages (negative: KiB)
+    SQLITE_JOURNAL_MODE: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = "WAL"
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_CACHE_SIZE: int = -65536
+    # Connection pool of each engine (sync and async). Pre-ping and recycling
+    # only apply to server databases, where connections can be dropped under us
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # -1 never recycles
     
     # API settings
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Visual Bio"
     
+    # Track storage: "rows" (one activity_routes row per point) or "packed" (one blob per activity)
+    TRACK_STORAGE: Literal["rows", "packed"] = "rows"
+    
+    # Maximum number of activities accepted by POST /activities/batch
+    BATCH_MAX_ACTIVITIES: int = 1000
+    
+    # Activities fetched per round trip by GET /activities/export (tracks are loaded per batch)
+    EXPORT_BATCH_SIZE: int = 200
+    
+    # Stats response cache: backend ("memory" or "none"), LRU size and entry lifetime
+    STATS_CACHE_BACKEND: Literal["memory", "none"] = "memory"
+    STATS_CACHE_MAX_ENTRIES: int = 1024
+    STATS_CACHE_TTL_SECONDS: float = 300.0
+    
+    # Where GET /activities/tiles/{z}/{x}/{y} caches built tiles, and how much each user may use
+    TILE_CACHE_DIR: str = "./tile_cache"
+    TILE_CACHE_MAX_BYTES_PER_USER: int = 64 * 1024 * 1024
+    
+    # GET /activities/heatmap: largest grid side in cells, and heatmaps kept in memory
+    HEATMAP_MAX_SIZE: int = 1024
+    HEATMAP_CACHE_MAX_ENTRIES: int = 32
+    
+    # Background imports: worker processes, max in-flight jobs per API process, upload spool directory
+    IMPORT_WORKERS: int = 2
+    IMPORT_MAX_PENDING: int = 32
+    IMPORT_SPOOL_DIR: str = "./import_spool"
+    # A job running longer than this is taken to have lost its worker and is requeued
+    IMPORT_JOB_LEASE_SECONDS: int = 3600
+    
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Password hashing: argon2 costs (changing them rehashes on next login) and
+    # how many hashes/verifications may run at once
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+    PASSWORD_HASH_WORKERS: int = 4
+    # Cache of users resolved from tokens: size and entry lifetime (0 disables it).
+    # Each process has its own cache, so a user deactivated through another
+    # process keeps authenticating here for up to the TTL; it is capped to bound that
+    AUTH_CACHE_MAX_ENTRIES: int = 4096
+    AUTH_CACHE_TTL_SECONDS: float = Field(60.0, ge=0, le=300)
     
     # Development/Production
     DEBUG: bool = True
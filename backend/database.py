@@ -1,4 +1,8 @@
-from sqlalchemy import create_engine
+from typing import Tuple, Union
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
@@ -9,14 +13,102 @@ if settings.POSTGRES_URL:
 else:
     database_url = settings.DATABASE_URL
 
-# Create engine
-engine = create_engine(
-    database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in database_url else {}
-)
+
+def sqlite_pragmas() -> dict:
+    """Pragmas set on every new SQLite connection, from the settings."""
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+    }
+
+
+def pool_options(url: Union[str, URL]) -> dict:
+    """Pool arguments for an engine on ``url``, from the settings."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory databases live in a single connection, not a sized pool
+        return {}
+    options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+    if url.get_backend_name() != "sqlite":
+        options.update(pool_pre_ping=settings.DB_POOL_PRE_PING, pool_recycle=settings.DB_POOL_RECYCLE_SECONDS)
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def configure_engine(engine: Engine) -> Engine:
+    """Apply the connection pragmas to ``engine`` (a no-op unless it is SQLite)."""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+# Async drivers for the same database, for handlers that await their queries
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """``url`` with its driver swapped for the asyncio one of its backend."""
+    url = make_url(url)
+    return url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}").render_as_string(hide_password=False)
+
+
+def create_engines(url: str) -> Tuple[Engine, AsyncEngine]:
+    """The sync and async engines of one database, with the configured pool and pragmas."""
+    sync_engine = configure_engine(create_engine(
+        url,
+        connect_args={"check_same_thread": False} if "sqlite" in url else {},
+        **pool_options(url)
+    ))
+    async_engine = create_async_engine(async_database_url(url), **pool_options(url))
+    configure_engine(async_engine.sync_engine)
+    return sync_engine, async_engine
+
+
+# Create engines
+engine, async_engine = create_engines(database_url)
+
+# Read-only endpoints go to READ_DATABASE_URL when set (see replicas.py)
+if settings.READ_DATABASE_URL:
+    read_engine, read_async_engine = create_engines(settings.READ_DATABASE_URL)
+else:
+    read_engine, read_async_engine = engine, async_engine
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Objects stay usable after commit instead of reloading on attribute access,
+# which an async session can't do implicitly
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(read_async_engine, autoflush=False, expire_on_commit=False)
+
+
+def describe_engine(engine: Engine) -> str:
+    """The effective connection settings of ``engine``, for the startup log."""
+    parts = [engine.url.render_as_string(hide_password=True), f"pool={type(engine.pool).__name__}"]
+    parts.extend(f"{name}={value}" for name, value in pool_options(engine.url).items())
+    if engine.dialect.name == "sqlite":
+        # Read back rather than echo the settings: e.g. WAL is refused on some filesystems
+        with engine.connect() as conn:
+            parts.extend(
+                f"{name}={conn.exec_driver_sql(f'PRAGMA {name}').scalar()}"
+                for name in sqlite_pragmas()
+            )
+    return " ".join(parts)
+
 
 # Create Base class
 Base = declarative_base()
@@ -28,4 +120,10 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """Dependency to get an async database session, for ``async def`` handlers"""
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""Conditional GET for per-user activity data.
+
+Every user has a ``data_version`` that writers bump with
+``bump_data_version`` in the same transaction as the activity change. GET
+endpoints add ``Depends(conditional_get)``: the ETag combines the user, the
+version and the request's path and query, and a matching ``If-None-Match``
+is answered with 304 before the endpoint runs, so an unchanged poll costs
+a single primary key lookup of the version.
+
+The version is always read from the database rather than from the
+authenticated user, which may come from ``auth.principal_cache``. It is
+read through ``replicas.get_async_read_db``, so from the same database the
+endpoint reads its data from, and before that data. Bodies built in the
+threadpool use a session of their own, so the two don't share a snapshot,
+but a cached body is never older than the version in its key. Caches that
+must not file newer data under an old version (heatmap, tiles) recheck
+with ``current_data_version`` on the session that built them.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from auth import get_current_active_user
+from models import User as UserModel
+from replicas import get_async_read_db
+
+# Clients may keep responses but must revalidate them every time
+CACHE_CONTROL = "private, no-cache"
+
+
+def bump_data_version(db: Session, user_id: Optional[int] = None) -> None:
+    """Invalidate the ETags of one user, or of everyone when ``user_id`` is None.
+
+    The caller owns the transaction.
+    """
+    query = db.query(UserModel)
+    if user_id is not None:
+        query = query.filter(UserModel.id == user_id)
+    query.update({UserModel.data_version: UserModel.data_version + 1}, synchronize_session=False)
+
+
+def current_data_version(db: Session, user_id: int) -> int:
+    return db.query(UserModel.data_version).filter(UserModel.id == user_id).scalar()
+
+
+def make_etag(user_id: int, data_version: int, path: str, query_items) -> str:
+    """Weak ETag for one user's view of ``path`` with the given query parameters."""
+    request_key = repr((path, sorted(query_items))).encode()
+    digest = hashlib.blake2b(request_key, digest_size=8).hexdigest()
+    return f'W/"{user_id}-{data_version}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    opaque = etag.removeprefix("W/")
+    return "*" in tags or any(tag.removeprefix("W/") == opaque for tag in tags)
+
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_read_db)
+) -> int:
+    """Dependency: set the response's ETag, or answer 304 if the client has it.
+
+    Returns the user's data version, for endpoints that key caches on it.
+    """
+    data_version = await db.scalar(select(UserModel.data_version).where(UserModel.id == current_user.id))
+    etag = make_etag(current_user.id, data_version, request.url.path, request.query_params.multi_items())
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return data_version
@@ -0,0 +1,76 @@
+"""Formatting and parsing helpers for activity durations and paces."""
+
+import re
+from typing import Optional
+
+_NUMBER = r"\d+(?:\.\d+)?"
+_DURATION_UNITS = {"h": 3600, "m": 60, "s": 1}
+_DURATION_PARTS = re.compile(rf"(?:\s*{_NUMBER}\s*[hms])+\s*")
+_DURATION_PART = re.compile(rf"({_NUMBER})\s*([hms])")
+_PACE = re.compile(r"\s*(\d+)\s*['′:]\s*(\d{1,2})\s*(?:\"|″|'')?\s*(?:/\s*km)?\s*")
+
+
+def format_pace_seconds(pace_seconds_per_km: float) -> str:
+    """Format a pace in seconds per km, e.g. 320 -> 5'20"/km."""
+    minutes = int(pace_seconds_per_km // 60)
+    seconds = int(pace_seconds_per_km % 60)
+    return f"{minutes}'{seconds:02d}\"/km"
+
+
+def format_pace(distance_km: float, time_seconds: int) -> str:
+    """Calculate and format pace from distance and time."""
+    if distance_km == 0:
+        return "0'00\"/km"
+
+    return format_pace_seconds(time_seconds / distance_km)
+
+
+def format_time_from_seconds(seconds: int) -> str:
+    """Format duration from seconds to human readable format."""
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    secs = seconds % 60
+
+    if hours > 0:
+        return f"{hours}h {minutes}m"
+    elif minutes > 0:
+        return f"{minutes}m {secs}s"
+    else:
+        return f"{secs}s"
+
+
+def parse_duration(text: str) -> int:
+    """Parse a duration string to seconds.
+
+    Accepts unit strings ("1h 23m", "26m 40s", "45s"), clock strings
+    ("1:23:45", "26:40") and bare numbers, which are minutes. Raises
+    ValueError for anything else.
+    """
+    value = text.strip().lower()
+    if re.fullmatch(_NUMBER, value):
+        return round(float(value) * 60)
+    if _DURATION_PARTS.fullmatch(value):
+        return round(sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_PART.findall(value)))
+
+    parts = value.split(":")
+    if 2 <= len(parts) <= 3 and all(re.fullmatch(_NUMBER, part) for part in parts):
+        seconds = 0.0
+        for part in parts:
+            seconds = seconds * 60 + float(part)
+        return round(seconds)
+    raise ValueError(f"Invalid duration '{text}'")
+
+
+def parse_pace(text: str) -> int:
+    """Parse a pace string like 5'20"/km or 5:20 to seconds per km."""
+    match = _PACE.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Invalid pace '{text}'")
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def pace_seconds_per_km(distance_km: float, time_seconds: Optional[int]) -> Optional[int]:
+    """Pace in whole seconds per km, or None when it is undefined."""
+    if not distance_km or not time_seconds:
+        return None
+    return round(time_seconds / distance_km)
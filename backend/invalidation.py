@@ -0,0 +1,21 @@
+"""Dropping data derived from a user's activities once they change.
+
+Writers call ``activities_changed`` after committing, with the track bounds
+of every activity they created, deleted or changed (before and after).
+Anything that caches per-user reads hooks in here, as does read replica
+routing (the user's reads stay on the primary for a while); the user's
+``data_version`` (see ``etags.py``) is bumped separately, inside the
+writing transaction.
+"""
+
+from typing import Iterable, Optional
+
+from cache import stats_cache
+from replicas import record_write
+from tracks.tiles import Bounds, invalidate_tiles
+
+
+def activities_changed(user_id: int, bounds: Iterable[Optional[Bounds]] = ()) -> None:
+    stats_cache.invalidate(user_id)
+    record_write(user_id)
+    invalidate_tiles(user_id, bounds)
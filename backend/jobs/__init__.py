@@ -0,0 +1,244 @@
+"""Background import jobs.
+
+Uploads are spooled to disk and recorded as ``ImportJob`` rows, then parsed
+and written by a bounded ``ProcessPoolExecutor`` so the CPU-heavy work runs
+outside the API process (and its GIL). Job state lives in the application
+database, so no external broker is needed and status survives restarts.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from config import settings
+from database import SessionLocal, engine
+from models import ActivityType, ImportJob, ImportJobStatus
+from tracks.tiles import Bounds
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = set()
+_lock = threading.Lock()
+# Set by shutdown, so jobs finishing afterwards don't start a new pool
+_stopped = False
+
+
+class ImportQueueFull(Exception):
+    """Raised when the API process already has IMPORT_MAX_PENDING jobs in flight."""
+
+
+def _init_worker():
+    # Never reuse pooled connections inherited from the parent process
+    engine.dispose(close=False)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+    return _executor
+
+
+def _job_done(job_id: str, future: Future) -> None:
+    with _lock:
+        _pending.discard(job_id)
+    if future.cancelled():
+        # Shutting down; the job stays queued for the next process
+        return
+    error = future.exception()
+    if error is not None:
+        # The worker itself died; record it so the job doesn't stay "running"
+        logger.error("Import job %s crashed: %s", job_id, error)
+        _finish_job(job_id, ImportJobStatus.FAILED, error=f"Import worker crashed: {error}")
+    elif future.result() is not None:
+        from invalidation import activities_changed
+        user_id, bounds = future.result()
+        activities_changed(user_id, [bounds])
+    if _stopped:
+        return
+    # A slot is free: take the next job waiting in the database
+    try:
+        submit_queued_jobs()
+    except Exception:
+        logger.exception("Could not submit queued import jobs")
+
+
+def submit_import(job_id: str) -> None:
+    """Queue a job on the process pool."""
+    global _executor
+    with _lock:
+        if len(_pending) >= settings.IMPORT_MAX_PENDING:
+            raise ImportQueueFull()
+        try:
+            future = _get_executor().submit(run_import_job, job_id)
+        except BrokenProcessPool:
+            _executor = None
+            future = _get_executor().submit(run_import_job, job_id)
+        _pending.add(job_id)
+    future.add_done_callback(lambda f: _job_done(job_id, f))
+
+
+def has_capacity() -> bool:
+    """Whether another job can be queued right now."""
+    with _lock:
+        return len(_pending) < settings.IMPORT_MAX_PENDING
+
+
+def _finish_job(job_id: str, status: ImportJobStatus, activity_id: Optional[int] = None, error: Optional[str] = None) -> None:
+    db = SessionLocal()
+    try:
+        job = db.get(ImportJob, job_id)
+        if job is None or job.status in (ImportJobStatus.SUCCEEDED, ImportJobStatus.FAILED):
+            return
+        job.status = status
+        job.activity_id = activity_id
+        job.error = error
+        job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        _remove_spool_file(job.file_path)
+    finally:
+        db.close()
+
+
+def _remove_spool_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def claim_job(db, job_id: str) -> bool:
+    """Mark a queued job running. Only one caller can win, whatever the
+    number of processes that were handed the job."""
+    claimed = db.query(ImportJob).filter(
+        ImportJob.id == job_id, ImportJob.status == ImportJobStatus.QUEUED
+    ).update(
+        {ImportJob.status: ImportJobStatus.RUNNING, ImportJob.started_at: datetime.now(timezone.utc)},
+        synchronize_session=False
+    )
+    db.commit()
+    return claimed == 1
+
+
+def run_import_job(job_id: str) -> Optional[Tuple[int, Optional[Bounds]]]:
+    """Process one import job. Runs inside a worker process.
+
+    Returns the user and track bounds of the imported activity, for the API
+    process to invalidate what it caches (``_job_done``); the caches and the
+    read-your-writes record live there, not in the worker.
+    """
+    from tracks.importer import import_track
+    from tracks.parsers import TrackParseError
+    from tracks.tiles import activity_bounds
+
+    db = SessionLocal()
+    try:
+        if not claim_job(db, job_id):
+            return None
+        job = db.get(ImportJob, job_id)
+
+        try:
+            with open(job.file_path, "rb") as fileobj:
+                activity = import_track(
+                    db, job.user_id, fileobj, job.file_format,
+                    ActivityType(job.activity_type), job.route
+                )
+            db.commit()
+        except (TrackParseError, OSError) as e:
+            db.rollback()
+            _finish_job(job_id, ImportJobStatus.FAILED, error=str(e))
+            return None
+        changed = (job.user_id, activity_bounds(activity))
+        _finish_job(job_id, ImportJobStatus.SUCCEEDED, activity_id=activity.id)
+        return changed
+    finally:
+        db.close()
+
+
+def requeue_stale_jobs(db) -> int:
+    """Put running jobs whose lease ran out back in the queue.
+
+    A job running for longer than ``IMPORT_JOB_LEASE_SECONDS`` is taken to
+    have lost its worker (the process died). Jobs other live processes are
+    working on are left alone. Returns the number of jobs requeued.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.IMPORT_JOB_LEASE_SECONDS)
+    requeued = db.query(ImportJob).filter(
+        ImportJob.status == ImportJobStatus.RUNNING, ImportJob.started_at < cutoff
+    ).update(
+        {ImportJob.status: ImportJobStatus.QUEUED, ImportJob.started_at: None},
+        synchronize_session=False
+    )
+    db.commit()
+    return requeued
+
+
+def submit_queued_jobs() -> int:
+    """Submit queued jobs this process isn't running yet, as capacity allows.
+
+    Runs on startup and whenever a job finishes, so jobs left queued by a
+    full pool or a dead process don't wait for a restart. Several processes
+    may submit the same job; ``claim_job`` lets only one of them run it.
+    Jobs whose spooled file is gone are marked failed. Returns the number
+    of jobs submitted.
+    """
+    db = SessionLocal()
+    try:
+        requeue_stale_jobs(db)
+        with _lock:
+            free = settings.IMPORT_MAX_PENDING - len(_pending)
+            pending = set(_pending)
+        if free <= 0:
+            return 0
+        query = db.query(ImportJob).filter(ImportJob.status == ImportJobStatus.QUEUED)
+        if pending:
+            query = query.filter(ImportJob.id.notin_(pending))
+        submit = []
+        for job in query.order_by(ImportJob.created_at).limit(free).all():
+            if os.path.exists(job.file_path):
+                submit.append(job.id)
+            else:
+                job.status = ImportJobStatus.FAILED
+                job.error = "Upload was lost before the job could run"
+                job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+
+    submitted = 0
+    for job_id in submit:
+        try:
+            submit_import(job_id)
+        except ImportQueueFull:
+            break
+        submitted += 1
+    return submitted
+
+
+def recover_jobs() -> int:
+    """Pick up jobs left queued, or running past their lease, by earlier processes.
+
+    Called on startup. Returns the number of jobs submitted.
+    """
+    global _stopped
+    _stopped = False
+    return submit_queued_jobs()
+
+
+def shutdown() -> None:
+    """Stop the worker pool. Jobs still queued are picked up again on the next start."""
+    global _executor, _stopped
+    _stopped = True
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,19 +1,45 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from routers import auth, users, activities
-from database import engine, get_db
+from routers import auth, users, activities, imports
+from database import async_engine, describe_engine, engine, get_db, read_async_engine, read_engine
 from models import Base
+from auth import principal_cache
+from cache import stats_cache
+from replicas import recent_writers
+from tracks.heatmap import heatmap_cache
+import jobs
+
+# uvicorn's logger, so startup lines show up alongside its own
+logger = logging.getLogger("uvicorn.error")
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background import workers and requeue unfinished jobs."""
+    logger.info("Database: %s", describe_engine(engine))
+    if read_engine is not engine:
+        logger.info("Read replica: %s", describe_engine(read_engine))
+    jobs.recover_jobs()
+    yield
+    jobs.shutdown()
+    await async_engine.dispose()
+    if read_async_engine is not async_engine:
+        await read_async_engine.dispose()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="Visual Bio API",
     description="API for tracking fitness activities and routes",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -23,6 +49,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Include routers
@@ -30,6 +57,7 @@ from config import settings
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["authentication"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
 app.include_router(activities.router, prefix=f"{settings.API_V1_STR}/activities", tags=["activities"])
+app.include_router(imports.router, prefix=f"{settings.API_V1_STR}/imports", tags=["imports"])
 
 
 @app.get("/")
@@ -58,6 +86,18 @@ def health_check(db: Session = Depends(get_db)):
         raise HTTPException(status_code=503, detail=f"Database connection failed: {str(e)}")
 
 
+@app.get("/metrics")
+def metrics():
+    """Cache counters for tuning"""
+    return {
+        "stats_cache": stats_cache.metrics(),
+        "heatmap_cache": heatmap_cache.metrics(),
+        # Hits are user lookups authentication didn't have to run
+        "auth_cache": principal_cache.metrics(),
+        "read_routing": recent_writers.metrics()
+    }
+
+
 @app.get(f"{settings.API_V1_STR}/")
 def api_info():
     """API information"""
@@ -68,6 +108,7 @@ def api_info():
             "auth": f"{settings.API_V1_STR}/auth",
             "users": f"{settings.API_V1_STR}/users",
             "activities": f"{settings.API_V1_STR}/activities",
+            "imports": f"{settings.API_V1_STR}/imports",
             "docs": "/docs",
             "redoc": "/redoc"
         }
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Visual Bio maintenance commands.
+
+Usage:
+    python manage.py pack-tracks [--batch-size 100]
+    python manage.py build-lods [--batch-size 100]
+    python manage.py compute-metrics [--batch-size 100]
+    python manage.py rebuild-rollups [--user-id 42]
+"""
+
+import argparse
+
+from database import SessionLocal
+from etags import bump_data_version
+
+
+def invalidate_cached_reads(db, user_id=None):
+    """Backfills change what reads return: invalidate ETags and cached stats."""
+    bump_data_version(db, user_id)
+    db.commit()
+
+
+def pack_tracks(args):
+    """Move row-stored tracks into packed blobs on their activities."""
+    from tracks.storage import pack_existing_tracks
+
+    db = SessionLocal()
+    try:
+        packed = pack_existing_tracks(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Packed {packed} activity tracks")
+
+
+def build_lods(args):
+    """Precompute simplified track levels for activities that don't have them."""
+    from tracks.storage import build_missing_lods
+    from tracks.tiles import clear_tiles
+
+    db = SessionLocal()
+    try:
+        built = build_missing_lods(db, batch_size=args.batch_size)
+        invalidate_cached_reads(db)
+        clear_tiles()
+    finally:
+        db.close()
+    print(f"Built levels of detail for {built} activity tracks")
+
+
+def compute_metrics(args):
+    """Derive distance, elevation, timing and split metrics for stored tracks."""
+    from tracks.storage import compute_missing_metrics
+    from tracks.tiles import clear_tiles
+
+    db = SessionLocal()
+    try:
+        processed = compute_missing_metrics(db, batch_size=args.batch_size)
+        invalidate_cached_reads(db)
+        clear_tiles()
+    finally:
+        db.close()
+    print(f"Computed metrics for {processed} activity tracks")
+
+
+def rebuild_rollups(args):
+    """Recompute the stats rollup tables from the activities table."""
+    from rollups import rebuild_rollups as rebuild
+
+    db = SessionLocal()
+    try:
+        users = rebuild(db, user_id=args.user_id)
+        invalidate_cached_reads(db, args.user_id)
+    finally:
+        db.close()
+    print(f"Rebuilt rollups for {users} users")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Visual Bio maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack = subparsers.add_parser("pack-tracks", help=pack_tracks.__doc__)
+    pack.add_argument("--batch-size", type=int, default=100)
+    pack.set_defaults(func=pack_tracks)
+
+    lods = subparsers.add_parser("build-lods", help=build_lods.__doc__)
+    lods.add_argument("--batch-size", type=int, default=100)
+    lods.set_defaults(func=build_lods)
+
+    metrics = subparsers.add_parser("compute-metrics", help=compute_metrics.__doc__)
+    metrics.add_argument("--batch-size", type=int, default=100)
+    metrics.set_defaults(func=compute_metrics)
+
+    rollups = subparsers.add_parser("rebuild-rollups", help=rebuild_rollups.__doc__)
+    rollups.add_argument("--user-id", type=int, help="Only rebuild this user's rollups")
+    rollups.set_defaults(func=rebuild_rollups)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, Text, ForeignKey, Enum, LargeBinary, UniqueConstraint, Index, JSON
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from datetime import datetime
 import enum
@@ -14,6 +14,13 @@ class ActivityType(str, enum.Enum):
     CYCLING = "cycling"
 
 
+class ImportJobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -23,6 +30,8 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     full_name = Column(String)
     is_active = Column(Boolean, default=True)
+    # Bumped by every activity write; drives ETags, see etags.py
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -32,6 +41,12 @@ class User(Base):
 
 class Activity(Base):
     __tablename__ = "activities"
+    __table_args__ = (
+        # Date ranges and keyset pagination over a user's activities
+        Index("ix_activities_user_id_date_id", "user_id", "date", "id"),
+        # Date ranges within one activity type
+        Index("ix_activities_user_id_activity_type_date", "user_id", "activity_type", "date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -40,21 +55,39 @@ class Activity(Base):
     pace = Column(String)  # e.g., "5'20\"/km"
     bpm = Column(Integer)  # heart rate
     time = Column(String)  # duration, e.g., "1h 23m"
+    duration_seconds = Column(Integer)  # parsed from time, for SQL aggregates
+    pace_seconds_per_km = Column(Integer)  # parsed from pace, for SQL aggregates
     route = Column(String)  # route name
     activity_type = Column(Enum(ActivityType), nullable=False)
+    track_data = deferred(Column(LargeBinary))  # packed track, see tracks.codec
+    track_points = Column(Integer, default=0)  # number of GPS points in the track
+    track_version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped whenever the track is replaced
+    # Derived from the track when it is written, see tracks.metrics
+    track_distance = Column(Float, index=True)  # in km
+    elevation_gain = Column(Float, index=True)  # in meters
+    elevation_loss = Column(Float)  # in meters
+    elapsed_seconds = Column(Integer)
+    moving_seconds = Column(Integer, index=True)
+    splits = Column(JSON)  # seconds per full km
+    # Bounding box of the track in degrees, for map tiles
+    min_lat = Column(Float)
+    min_lng = Column(Float)
+    max_lat = Column(Float)
+    max_lng = Column(Float)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     user = relationship("User", back_populates="activities")
     route_coordinates = relationship("ActivityRoute", back_populates="activity", cascade="all, delete-orphan")
+    track_lods = relationship("ActivityTrackLOD", back_populates="activity", cascade="all, delete-orphan")
 
 
 class ActivityRoute(Base):
     __tablename__ = "activity_routes"
     
     id = Column(Integer, primary_key=True, index=True)
-    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=False)
+    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=False, index=True)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     elevation = Column(Float)  # in meters
@@ -62,4 +95,68 @@ class ActivityRoute(Base):
     order_index = Column(Integer, default=0)  # for ordering points
     
     # Relationships
-    activity = relationship("Activity", back_populates="route_coordinates")
\ No newline at end of file
+    activity = relationship("Activity", back_populates="route_coordinates")
+
+
+class ActivityTrackLOD(Base):
+    __tablename__ = "activity_track_lods"
+    __table_args__ = (UniqueConstraint("activity_id", "level"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=False, index=True)
+    level = Column(String, nullable=False)  # see tracks.simplify.LOD_LEVELS
+    tolerance = Column(Float, nullable=False)  # in meters
+    point_count = Column(Integer, nullable=False)
+    track_data = Column(LargeBinary, nullable=False)  # packed, see tracks.codec
+    
+    # Relationships
+    activity = relationship("Activity", back_populates="track_lods")
+
+
+class ActivityRollup(Base):
+    """Per-user activity totals for one day, month or year, see rollups.py."""
+    __tablename__ = "activity_rollups"
+    __table_args__ = (UniqueConstraint("user_id", "period", "period_start"),)
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    period = Column(String, nullable=False)  # day, month or year
+    period_start = Column(Date, nullable=False)
+    activity_count = Column(Integer, nullable=False, default=0)
+    distance = Column(Float, nullable=False, default=0)  # in km
+    duration_seconds = Column(Integer, nullable=False, default=0)
+    timed_distance = Column(Float, nullable=False, default=0)  # km of activities with a duration
+    active_days = Column(Integer, nullable=False, default=0)  # days with activities in the period
+
+
+class ActivityRouteRollup(Base):
+    """Per-user activity count for each route and year, see rollups.py."""
+    __tablename__ = "activity_route_rollups"
+    __table_args__ = (UniqueConstraint("user_id", "year", "route"),)
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    route = Column(String, nullable=False)
+    activity_count = Column(Integer, nullable=False, default=0)
+
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(Enum(ImportJobStatus), nullable=False, default=ImportJobStatus.QUEUED)
+    filename = Column(String)  # original upload name
+    file_format = Column(String, nullable=False)  # gpx, tcx or fit
+    file_path = Column(String, nullable=False)  # spooled upload, removed when the job finishes
+    activity_type = Column(String, nullable=False)
+    route = Column(String)
+    activity_id = Column(Integer, ForeignKey("activities.id", ondelete="SET NULL"))  # cleared if the activity is deleted
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    
+    # Relationships
+    user = relationship("User")
@@ -0,0 +1,116 @@
+"""Routing reads to the read replica.
+
+With ``READ_DATABASE_URL`` set, read-only endpoints take their session from
+``get_read_db`` / ``get_async_read_db``, which are bound to the replica.
+A user who wrote in the last ``READ_STICKINESS_SECONDS`` gets a primary
+session instead, so they read their own writes despite replication lag.
+Writes are recorded by ``invalidation.activities_changed`` and
+``PUT /users/me``.
+
+The record lives in the API process, like the other caches. With several
+processes, a client that reads through a different process than it wrote
+through may briefly see the replica's older state; the ETag and stats
+cache stay consistent with whatever that session returned.
+
+Without a replica both dependencies hand out primary sessions.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import database
+from auth import get_current_active_user
+from config import settings
+from models import User as UserModel
+
+
+class RecentWriters:
+    """Users who wrote within the last ``window`` seconds, with counters for ``/metrics``."""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.primary_reads = 0
+        self.replica_reads = 0
+        # Oldest write first, so expired users are dropped from the front
+        self._writes: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._writes and next(iter(self._writes.values())) <= now - self.window:
+            self._writes.popitem(last=False)
+
+    def record(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._writes[user_id] = now
+            self._writes.move_to_end(user_id)
+            self._expire(now)
+
+    def is_recent(self, user_id: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            return user_id in self._writes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._writes.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "replica": database.read_engine is not database.engine,
+            "sticky_users": len(self._writes),
+            "primary_reads": self.primary_reads,
+            "replica_reads": self.replica_reads,
+        }
+
+
+recent_writers = RecentWriters(settings.READ_STICKINESS_SECONDS)
+
+
+def record_write(user_id: int) -> None:
+    """Keep ``user_id``'s reads on the primary for the stickiness window."""
+    recent_writers.record(user_id)
+
+
+def _use_primary(user_id: int) -> bool:
+    if recent_writers.is_recent(user_id):
+        recent_writers.primary_reads += 1
+        return True
+    recent_writers.replica_reads += 1
+    return False
+
+
+def read_sessionmaker(user_id: int) -> sessionmaker:
+    """The session factory ``user_id``'s reads should use right now."""
+    return database.SessionLocal if _use_primary(user_id) else database.ReadSessionLocal
+
+
+def async_read_sessionmaker(user_id: int) -> async_sessionmaker:
+    return database.AsyncSessionLocal if _use_primary(user_id) else database.AsyncReadSessionLocal
+
+
+def sync_sessionmaker(db: AsyncSession) -> sessionmaker:
+    """The sync session factory on the database ``db`` was routed to, for
+    work handed from an async endpoint to the threadpool."""
+    return database.SessionLocal if db.bind is database.async_engine else database.ReadSessionLocal
+
+
+def get_read_db(current_user: UserModel = Depends(get_current_active_user)):
+    """Dependency to get a session for read-only endpoints"""
+    db = read_sessionmaker(current_user.id)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(current_user: UserModel = Depends(get_current_active_user)):
+    """Dependency to get an async session for read-only ``async def`` endpoints"""
+    async with async_read_sessionmaker(current_user.id)() as db:
+        yield db
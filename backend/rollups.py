@@ -0,0 +1,251 @@
+"""Per-user activity rollups behind the stats endpoints.
+
+``activity_rollups`` keeps running totals per user for every day, month and
+year that has activities, and ``activity_route_rollups`` counts activities
+per route and year so distinct routes can be counted without scanning
+activities. Day rows double as distinct-day markers: a day appearing or
+disappearing moves ``active_days`` on its month and year.
+
+Writers call ``apply_rollups`` in the same transaction as the activity
+change, so the stats endpoints read O(years) rows. They call
+``bump_data_version`` first: its UPDATE locks the user's row, which keeps
+concurrent writes for one user from both counting a new day as active.
+``rebuild_rollups`` recomputes everything from the activities table to
+repair drift.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from itertools import chain
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from models import (
+    Activity as ActivityModel, ActivityRollup as ActivityRollupModel,
+    ActivityRouteRollup as ActivityRouteRollupModel, User as UserModel
+)
+
+PERIOD_DAY = "day"
+PERIOD_MONTH = "month"
+PERIOD_YEAR = "year"
+PERIODS = (PERIOD_DAY, PERIOD_MONTH, PERIOD_YEAR)
+
+TOTAL_COLUMNS = ("activity_count", "distance", "duration_seconds", "timed_distance", "active_days")
+
+
+class ActivityFacts(NamedTuple):
+    """The activity fields rollups depend on."""
+    user_id: int
+    date: datetime
+    distance: float
+    duration_seconds: Optional[int]
+    route: Optional[str]
+
+    @classmethod
+    def of(cls, activity) -> "ActivityFacts":
+        return cls(activity.user_id, activity.date, activity.distance, activity.duration_seconds, activity.route)
+
+
+def utc_day(value: datetime) -> date:
+    """The UTC day of ``value``; naive datetimes are taken as UTC, like stored dates."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def period_start(day: date, period: str) -> date:
+    """First day of the day/month/year containing ``day``."""
+    if period == PERIOD_YEAR:
+        return date(day.year, 1, 1)
+    if period == PERIOD_MONTH:
+        return date(day.year, day.month, 1)
+    return day
+
+
+def _collect(added: Iterable[ActivityFacts], removed: Iterable[ActivityFacts]):
+    """Sum the changes to every affected rollup row.
+
+    Returns ``{(user_id, period, period_start): [totals...]}`` in
+    ``TOTAL_COLUMNS`` order, with active days left for
+    ``_count_active_days``, and ``{(user_id, year, route): count}``.
+    """
+    totals = defaultdict(lambda: [0, 0.0, 0, 0.0, 0])
+    routes = defaultdict(int)
+    for facts, sign in chain(((f, 1) for f in added), ((f, -1) for f in removed)):
+        day = utc_day(facts.date)
+        for period in PERIODS:
+            row = totals[(facts.user_id, period, period_start(day, period))]
+            row[0] += sign
+            row[1] += sign * facts.distance
+            if facts.duration_seconds is not None:
+                row[2] += sign * facts.duration_seconds
+                row[3] += sign * facts.distance
+        if facts.route:
+            routes[(facts.user_id, day.year, facts.route)] += sign
+    return totals, routes
+
+
+def _count_active_days(totals, day_counts_before: Dict[Tuple[int, date], int]) -> None:
+    """Move ``active_days`` for every day that gains its first or loses its last activity."""
+    for (user_id, period, start), row in list(totals.items()):
+        if period != PERIOD_DAY:
+            continue
+        before = day_counts_before.get((user_id, start), 0)
+        change = (before + row[0] > 0) - (before > 0)
+        if change:
+            for marked in PERIODS:
+                totals[(user_id, marked, period_start(start, marked))][4] += change
+
+
+def _rollup_rows(totals) -> List[dict]:
+    return [
+        {"user_id": user_id, "period": period, "period_start": start, **dict(zip(TOTAL_COLUMNS, row))}
+        for (user_id, period, start), row in totals.items()
+        if any(row)
+    ]
+
+
+def _route_rows(routes) -> List[dict]:
+    return [
+        {"user_id": user_id, "year": year, "route": route, "activity_count": count}
+        for (user_id, year, route), count in routes.items()
+        if count
+    ]
+
+
+def _upsert(db: Session):
+    """The dialect's INSERT supporting ON CONFLICT DO UPDATE."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def apply_rollups(db: Session, added: Iterable[ActivityFacts] = (), removed: Iterable[ActivityFacts] = ()) -> None:
+    """Adjust rollups for created (``added``), deleted (``removed``) or
+    updated (both, old and new facts) activities.
+
+    Every touched row is changed with one executemany upsert per table;
+    rows that drop to zero activities are deleted. The caller owns the
+    transaction and must hold the row lock of every user involved (see
+    ``bump_data_version``), since active days are counted from the day rows
+    read here.
+    """
+    totals, routes = _collect(added, removed)
+    if not totals:
+        return
+
+    user_ids = {user_id for user_id, _, _ in totals}
+    days = [start for (_, period, start) in totals if period == PERIOD_DAY]
+    day_counts_before = {
+        (user_id, start): count
+        for user_id, start, count in db.query(
+            ActivityRollupModel.user_id, ActivityRollupModel.period_start, ActivityRollupModel.activity_count
+        ).filter(
+            ActivityRollupModel.user_id.in_(user_ids),
+            ActivityRollupModel.period == PERIOD_DAY,
+            ActivityRollupModel.period_start.in_(days)
+        )
+    }
+    _count_active_days(totals, day_counts_before)
+
+    dialect_insert = _upsert(db)
+    rows = _rollup_rows(totals)
+    if rows:
+        stmt = dialect_insert(ActivityRollupModel)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "period", "period_start"],
+            set_={column: getattr(ActivityRollupModel, column) + stmt.excluded[column] for column in TOTAL_COLUMNS}
+        ), rows)
+    route_rows = _route_rows(routes)
+    if route_rows:
+        stmt = dialect_insert(ActivityRouteRollupModel)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "year", "route"],
+            set_={"activity_count": ActivityRouteRollupModel.activity_count + stmt.excluded.activity_count}
+        ), route_rows)
+
+    db.query(ActivityRollupModel).filter(
+        ActivityRollupModel.user_id.in_(user_ids),
+        ActivityRollupModel.activity_count <= 0
+    ).delete(synchronize_session=False)
+    db.query(ActivityRouteRollupModel).filter(
+        ActivityRouteRollupModel.user_id.in_(user_ids),
+        ActivityRouteRollupModel.activity_count <= 0
+    ).delete(synchronize_session=False)
+
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute rollups from the activities table, for one user or everyone.
+
+    Commits once per user. Returns the number of users rebuilt.
+    """
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [uid for (uid,) in db.query(UserModel.id).order_by(UserModel.id)]
+
+    for uid in user_ids:
+        db.query(ActivityRollupModel).filter(ActivityRollupModel.user_id == uid).delete(synchronize_session=False)
+        db.query(ActivityRouteRollupModel).filter(ActivityRouteRollupModel.user_id == uid).delete(synchronize_session=False)
+
+        activities = db.query(
+            ActivityModel.user_id, ActivityModel.date, ActivityModel.distance,
+            ActivityModel.duration_seconds, ActivityModel.route
+        ).filter(ActivityModel.user_id == uid).yield_per(1000)
+        totals, routes = _collect((ActivityFacts(*row) for row in activities), ())
+        _count_active_days(totals, {})
+
+        rows = _rollup_rows(totals)
+        if rows:
+            db.execute(insert(ActivityRollupModel), rows)
+        route_rows = _route_rows(routes)
+        if route_rows:
+            db.execute(insert(ActivityRouteRollupModel), route_rows)
+        db.commit()
+    return len(user_ids)
+
+
+def overview_totals(db: Session, user_id: int):
+    """All-time totals for a user, summed over their year rollups.
+
+    Returns a row with ``TOTAL_COLUMNS`` plus ``routes``.
+    """
+    return db.query(
+        *(func.coalesce(func.sum(getattr(ActivityRollupModel, column)), 0).label(column) for column in TOTAL_COLUMNS),
+        db.query(func.count(func.distinct(ActivityRouteRollupModel.route))).filter(
+            ActivityRouteRollupModel.user_id == user_id
+        ).scalar_subquery().label("routes")
+    ).filter(
+        ActivityRollupModel.user_id == user_id,
+        ActivityRollupModel.period == PERIOD_YEAR
+    ).one()
+
+
+def yearly_totals(db: Session, user_id: int) -> List[Tuple[ActivityRollupModel, int]]:
+    """A user's year rollups, newest first, each with its distinct route count."""
+    years = db.query(ActivityRollupModel).filter(
+        ActivityRollupModel.user_id == user_id,
+        ActivityRollupModel.period == PERIOD_YEAR
+    ).order_by(ActivityRollupModel.period_start.desc()).all()
+    routes = dict(
+        db.query(ActivityRouteRollupModel.year, func.count(ActivityRouteRollupModel.id)).filter(
+            ActivityRouteRollupModel.user_id == user_id
+        ).group_by(ActivityRouteRollupModel.year).all()
+    )
+    return [(rollup, routes.get(rollup.period_start.year, 0)) for rollup in years]
+
+
+def daily_totals(db: Session, user_id: int, year: int) -> List[Tuple[date, int, float]]:
+    """``(day, activity_count, distance)`` of every day of ``year`` with activities, in order."""
+    return db.query(
+        ActivityRollupModel.period_start, ActivityRollupModel.activity_count, ActivityRollupModel.distance
+    ).filter(
+        ActivityRollupModel.user_id == user_id,
+        ActivityRollupModel.period == PERIOD_DAY,
+        ActivityRollupModel.period_start >= date(year, 1, 1),
+        ActivityRollupModel.period_start < date(year + 1, 1, 1)
+    ).order_by(ActivityRollupModel.period_start).all()
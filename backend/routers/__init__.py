@@ -1 +1 @@
-from . import auth, users, activities
\ No newline at end of file
+from . import auth, users, activities, imports
\ No newline at end of file
@@ -0,0 +1,98 @@
+import os
+import shutil
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, status, File, Form, UploadFile
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from schemas import ImportJob
+from models import ActivityType, ImportJob as ImportJobModel, User as UserModel
+from database import get_db
+from auth import get_current_active_user
+from config import settings
+from tracks.parsers import TrackParseError, detect_format
+import jobs
+
+router = APIRouter()
+
+
+@router.post("/", response_model=ImportJob, status_code=status.HTTP_202_ACCEPTED)
+def create_import_job(
+    file: UploadFile = File(...),
+    activity_type: ActivityType = Form(...),
+    route: Optional[str] = Form(None),
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Queue a GPX, TCX or FIT file for background import.
+
+    Returns immediately with a job id; poll GET /imports/{job_id} for the
+    result. The file is parsed and stored by a worker process.
+    """
+    try:
+        fmt = detect_format(file.filename, file.file)
+    except TrackParseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not jobs.has_capacity():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Import queue is full, try again later"
+        )
+    
+    job_id = uuid.uuid4().hex
+    os.makedirs(settings.IMPORT_SPOOL_DIR, exist_ok=True)
+    file_path = os.path.abspath(os.path.join(settings.IMPORT_SPOOL_DIR, f"{job_id}.{fmt}"))
+    with open(file_path, "wb") as spool:
+        shutil.copyfileobj(file.file, spool)
+    
+    db_job = ImportJobModel(
+        id=job_id,
+        user_id=current_user.id,
+        filename=file.filename,
+        file_format=fmt,
+        file_path=file_path,
+        activity_type=activity_type.value,
+        route=route
+    )
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    
+    try:
+        jobs.submit_import(job_id)
+    except jobs.ImportQueueFull:
+        # Stays queued in the database and is picked up when a job finishes
+        pass
+    
+    return db_job
+
+
+@router.get("/", response_model=List[ImportJob])
+def read_import_jobs(
+    skip: int = 0,
+    limit: int = 100,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the current user's import jobs, newest first."""
+    return db.query(ImportJobModel).filter(
+        ImportJobModel.user_id == current_user.id
+    ).order_by(ImportJobModel.created_at.desc()).offset(skip).limit(limit).all()
+
+
+@router.get("/{job_id}", response_model=ImportJob)
+def read_import_job(
+    job_id: str,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status of an import job."""
+    job = db.query(ImportJobModel).filter(
+        ImportJobModel.id == job_id,
+        ImportJobModel.user_id == current_user.id
+    ).first()
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    
+    return job
@@ -1,26 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas import User, UserCreate, UserUpdate
 from models import User as UserModel
-from database import get_db
-from auth import get_password_hash, get_current_active_user
+from database import get_async_db
+from auth import get_password_hash_async, get_current_active_user, invalidate_principal
+from replicas import get_async_read_db, record_write
 
 router = APIRouter()
 
 
 @router.post("/", response_model=User, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new user."""
     # Check if user already exists
-    db_user = db.query(UserModel).filter(UserModel.email == user.email).first()
+    db_user = await db.scalar(select(UserModel).where(UserModel.email == user.email).limit(1))
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
     
-    db_user = db.query(UserModel).filter(UserModel.username == user.username).first()
+    db_user = await db.scalar(select(UserModel).where(UserModel.username == user.username).limit(1))
     if db_user:
         raise HTTPException(
             status_code=400,
@@ -28,7 +29,7 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = UserModel(
         email=user.email,
         username=user.username,
@@ -36,40 +37,42 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password,
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.get("/me", response_model=User)
-def read_user_me(current_user: User = Depends(get_current_active_user)):
+async def read_user_me(current_user: User = Depends(get_current_active_user)):
     """Get current user info."""
     return current_user
 
 
 @router.put("/me", response_model=User)
-def update_user_me(
+async def update_user_me(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user info."""
-    db_user = db.query(UserModel).filter(UserModel.id == current_user.id).first()
+    db_user = await db.get(UserModel, current_user.id)
     
     update_data = user_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_user, field, value)
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    invalidate_principal(db_user.id)
+    record_write(db_user.id)
+    await db.refresh(db_user)
     return db_user
 
 
 @router.get("/{user_id}", response_model=User)
-def read_user(
+async def read_user(
     user_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get user by ID (only if it's the current user or admin)."""
     if current_user.id != user_id:
@@ -78,7 +81,7 @@ def read_user(
             detail="Not enough permissions"
         )
     
-    db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    db_user = await db.get(UserModel, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return db_user
\ No newline at end of file
+    return db_user
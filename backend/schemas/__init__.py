@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
-from models import ActivityType
+from pydantic import BaseModel, EmailStr, field_validator
+from typing import Optional, List, Any, Dict, Literal
+from datetime import datetime, timezone
+from models import ActivityType, ImportJobStatus
 
 
 class UserBase(BaseModel):
@@ -38,6 +38,20 @@ class ActivityRouteCoordinate(BaseModel):
     timestamp: Optional[datetime] = None
 
 
+# Level of detail for returned coordinates, see tracks.simplify.LOD_LEVELS
+TrackResolution = Literal["low", "medium", "high", "full"]
+
+# Encoding of GET /activities/heatmap, see tracks.heatmap
+HeatmapFormat = Literal["json", "png"]
+
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Offset datetimes as UTC, so SQLite stores the same instant as Postgres."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc)
+    return value
+
+
 class ActivityBase(BaseModel):
     date: datetime
     distance: float  # in km
@@ -48,6 +62,11 @@ class ActivityBase(BaseModel):
     activity_type: ActivityType
     coordinates: Optional[List[ActivityRouteCoordinate]] = []
 
+    @field_validator("date")
+    @classmethod
+    def date_to_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        return to_utc(value)
+
 
 class ActivityCreate(ActivityBase):
     pass
@@ -63,10 +82,23 @@ class ActivityUpdate(BaseModel):
     activity_type: Optional[ActivityType] = None
     coordinates: Optional[List[ActivityRouteCoordinate]] = []
 
+    @field_validator("date")
+    @classmethod
+    def date_to_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        return to_utc(value)
+
 
 class Activity(ActivityBase):
     id: int
     user_id: int
+    duration_seconds: Optional[int] = None
+    pace_seconds_per_km: Optional[int] = None
+    track_distance: Optional[float] = None  # in km, derived from the track
+    elevation_gain: Optional[float] = None  # in meters
+    elevation_loss: Optional[float] = None  # in meters
+    elapsed_seconds: Optional[int] = None
+    moving_seconds: Optional[int] = None
+    splits: Optional[List[float]] = None  # seconds per full km
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -74,17 +106,57 @@ class Activity(ActivityBase):
         from_attributes = True
 
 
+class ActivityBatchCreate(BaseModel):
+    # Items are validated one by one so a bad item doesn't reject the batch
+    activities: List[Dict[str, Any]]
+
+
+class ActivityBatchItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class ActivityBatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[ActivityBatchItemResult]
+
+
 class ActivityStats(BaseModel):
     Distance: float  # in km
     Days: int
-    AvgPace: str
+    AvgPace: str  # distance-weighted over activities with a duration
     Routes: int
+    Duration: int = 0  # total seconds
 
 
 class YearData(BaseModel):
     year: int
     stats: ActivityStats
-    activities: List[Activity]
+    activity_count: int = 0  # all activities in the year; page them with GET /activities/?year=
+    activities: List[Activity]  # newest first, limited per year
+
+
+class DailyStats(BaseModel):
+    year: int
+    # One entry per day of the year, January 1st first
+    distance: List[float]  # in km
+    activity_count: List[int]
+
+
+class ImportJob(BaseModel):
+    id: str
+    status: ImportJobStatus
+    filename: Optional[str] = None
+    activity_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 
 class Token(BaseModel):
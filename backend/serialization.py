@@ -0,0 +1,69 @@
+"""Fast JSON encoding of activity responses.
+
+Building a ``schemas.Activity`` per ORM row and validating it dominated the
+list, yearly and export responses. Here activities are selected as plain
+row tuples and encoded with orjson, producing the same wire format as the
+response models: schema field order, enum values, and ISO datetimes with
+``Z`` for UTC. ``coordinates`` is only present when it is among the fields.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import orjson
+
+from models import Activity as ActivityModel
+from schemas import Activity
+
+# Every field of schemas.Activity, in order
+ACTIVITY_FIELDS = tuple(Activity.model_fields)
+# ...and those that are activity columns
+COLUMN_FIELDS = tuple(name for name in ACTIVITY_FIELDS if name != "coordinates")
+
+# Selected after the output columns: the cursor needs date and id, tracks need track_points
+_TRAILING_COLUMNS = ("id", "date", "track_points")
+
+OPTIONS = orjson.OPT_UTC_Z
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value, option=OPTIONS)
+
+
+def activity_columns(fields: Sequence[str]) -> list:
+    """Columns to select for ``fields``: the fields' own columns in order,
+    then the bookkeeping columns, which ``activity_dicts`` ignores."""
+    columns = [name for name in fields if name != "coordinates"]
+    return [getattr(ActivityModel, name) for name in columns] + [
+        getattr(ActivityModel, name).label(f"row_{name}") for name in _TRAILING_COLUMNS
+    ]
+
+
+def activity_dicts(rows: Iterable, fields: Sequence[str], tracks: Optional[Dict[int, object]] = None) -> Iterator[dict]:
+    """Activity dicts with ``fields``, in that order, from rows selected with
+    ``activity_columns(fields)``.
+
+    ``coordinates`` comes from ``tracks`` (keyed by activity id) and is
+    ``[]`` for activities without one. Tracks are popped from ``tracks`` as
+    they are encoded so their decoded arrays can be freed.
+    """
+    columns = [name for name in fields if name != "coordinates"]
+    position = fields.index("coordinates") if "coordinates" in fields else None
+    for row in rows:
+        pairs = list(zip(columns, row))
+        if position is not None:
+            track = tracks.pop(row[-3], None) if tracks else None
+            pairs.insert(position, ("coordinates", track.to_coordinates() if track is not None else []))
+        yield dict(pairs)
+
+
+class RowKeys:
+    """The id, date and track_points of a row selected with ``activity_columns``,
+    for cursors and ``tracks.storage.load_tracks_at``."""
+    __slots__ = _TRAILING_COLUMNS
+
+    def __init__(self, row):
+        self.id, self.date, self.track_points = row[-3:]
+
+
+def row_keys(rows: Iterable) -> List[RowKeys]:
+    return [RowKeys(row) for row in rows]
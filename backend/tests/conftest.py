@@ -1,7 +1,17 @@
 """Test utilities for the backend"""
 
 from typing import Dict, Any
+import atexit
 import json
+import os
+import shutil
+import tempfile
+
+# Run against a scratch database instead of the tracked development one. Set
+# before any test module imports config, and inherited by import workers.
+_db_dir = tempfile.mkdtemp(prefix="visual_bio_test_")
+atexit.register(shutil.rmtree, _db_dir, ignore_errors=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
 
 def assert_valid_activity(activity: Dict[str, Any]) -> None:
     """Assert that an activity object has valid structure"""
@@ -4,7 +4,7 @@ import pytest
 from fastapi.testclient import TestClient
 import sys
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from main import app
 from tests.conftest import assert_valid_activity, create_activity_payload
@@ -397,4 +397,505 @@ def test_create_activity_invalid_data():
     response = client.post("/api/v1/activities/", json=invalid_activity, headers=headers)
     
     # Should return validation error
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+def test_create_activity_stores_route_in_order():
+    """Test that route coordinates are bulk inserted in order with the activity"""
+    from database import SessionLocal
+    from models import ActivityRoute
+
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    coordinates = [
+        {"lat": 40.7128 + i * 0.001, "lng": -74.0060, "elevation": 10.0 + i}
+        for i in range(50)
+    ]
+    activity_data = {
+        "date": "2024-01-15T10:00:00",
+        "distance": 5.0,
+        "activity_type": "run",
+        "coordinates": coordinates
+    }
+    
+    response = client.post("/api/v1/activities/", json=activity_data, headers=headers)
+    assert response.status_code == 201
+    activity_id = response.json()["id"]
+    
+    db = SessionLocal()
+    try:
+        points = db.query(ActivityRoute).filter(
+            ActivityRoute.activity_id == activity_id
+        ).order_by(ActivityRoute.order_index).all()
+    finally:
+        db.close()
+    
+    assert len(points) == 50
+    assert [p.order_index for p in points] == list(range(50))
+    assert points[10].latitude == pytest.approx(40.7228)
+    assert points[10].elevation == 20.0
+
+def test_update_activity_replaces_route():
+    """Test that updating coordinates replaces the stored route"""
+    from database import SessionLocal
+    from models import ActivityRoute
+
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    activity_data = {
+        "date": "2024-01-15T10:00:00",
+        "distance": 5.0,
+        "activity_type": "run",
+        "coordinates": [{"lat": 40.7128, "lng": -74.0060}, {"lat": 40.7138, "lng": -74.0050}]
+    }
+    response = client.post("/api/v1/activities/", json=activity_data, headers=headers)
+    assert response.status_code == 201
+    activity_id = response.json()["id"]
+    
+    update_data = {"coordinates": [{"lat": 1.0, "lng": 2.0}, {"lat": 1.5, "lng": 2.5}, {"lat": 2.0, "lng": 3.0}]}
+    response = client.put(f"/api/v1/activities/{activity_id}", json=update_data, headers=headers)
+    assert response.status_code == 200
+    
+    db = SessionLocal()
+    try:
+        points = db.query(ActivityRoute).filter(
+            ActivityRoute.activity_id == activity_id
+        ).order_by(ActivityRoute.order_index).all()
+    finally:
+        db.close()
+    
+    assert [(p.latitude, p.longitude) for p in points] == [(1.0, 2.0), (1.5, 2.5), (2.0, 3.0)]
+
+def test_create_activities_batch():
+    """Test creating several activities in one batch with per-item results"""
+    from database import SessionLocal
+    from models import ActivityRoute
+
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    batch = {
+        "activities": [
+            {
+                "date": "2024-01-15T10:00:00",
+                "distance": 5.0,
+                "activity_type": "run",
+                "coordinates": [{"lat": 40.7128, "lng": -74.0060}, {"lat": 40.7138, "lng": -74.0050}]
+            },
+            {"activity_type": "run"},
+            {
+                "date": "2024-01-16T10:00:00",
+                "distance": 20.0,
+                "time": "1h 0m",
+                "activity_type": "cycling"
+            }
+        ]
+    }
+    
+    response = client.post("/api/v1/activities/batch", json=batch, headers=headers)
+    
+    assert response.status_code == 200
+    result = response.json()
+    assert result["created"] == 2
+    assert result["failed"] == 1
+    first, invalid, third = result["results"]
+    assert isinstance(first["id"], int) and first["error"] is None
+    assert invalid["id"] is None and "distance" in invalid["error"]
+    assert isinstance(third["id"], int)
+    
+    response = client.get(f"/api/v1/activities/{third['id']}", headers=headers)
+    assert response.json()["pace"] == "3'00\"/km"
+    
+    db = SessionLocal()
+    try:
+        points = db.query(ActivityRoute).filter(ActivityRoute.activity_id == first["id"]).count()
+    finally:
+        db.close()
+    assert points == 2
+
+def test_create_activities_batch_too_large():
+    """Test that oversized batches are rejected"""
+    from config import settings
+
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    item = {"date": "2024-01-15T10:00:00", "distance": 5.0, "activity_type": "run"}
+    batch = {"activities": [item] * (settings.BATCH_MAX_ACTIVITIES + 1)}
+    
+    response = client.post("/api/v1/activities/batch", json=batch, headers=headers)
+    
+    assert response.status_code == 413
+
+def test_create_activity_numeric_timing():
+    """Test that duration and pace are stored as numbers alongside the strings"""
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    activity = {"date": "2024-01-15T10:00:00", "distance": 10.0, "time": "1h 0m", "activity_type": "run"}
+    response = client.post("/api/v1/activities/", json=activity, headers=headers)
+    
+    assert response.status_code == 201
+    created = response.json()
+    assert created["duration_seconds"] == 3600
+    assert created["pace_seconds_per_km"] == 360
+    assert created["pace"] == "6'00\"/km"
+    
+    response = client.put(f"/api/v1/activities/{created['id']}", json={"time": "50:00", "pace": None}, headers=headers)
+    updated = response.json()
+    assert updated["duration_seconds"] == 3000
+    assert updated["pace_seconds_per_km"] == 300
+    
+    response = client.post("/api/v1/activities/", json={**activity, "time": "an hour"}, headers=headers)
+    assert response.status_code == 422
+
+def test_activity_stats_weighted_pace():
+    """Test that stats sum durations and weight the average pace by distance"""
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    activities = [
+        {"date": "2023-06-01T10:00:00", "distance": 10.0, "time": "50m", "route": "A", "activity_type": "run"},
+        {"date": "2024-01-15T10:00:00", "distance": 5.0, "time": "30m", "route": "A", "activity_type": "run"},
+        # No duration: counts towards distance but not the pace
+        {"date": "2024-01-16T10:00:00", "distance": 3.0, "route": "B", "activity_type": "run"},
+    ]
+    for activity in activities:
+        assert client.post("/api/v1/activities/", json=activity, headers=headers).status_code == 201
+    
+    stats = client.get("/api/v1/activities/stats/overview", headers=headers).json()
+    assert stats == {"Distance": 18.0, "Days": 3, "AvgPace": "5'20\"/km", "Routes": 2, "Duration": 4800}
+    
+    yearly = client.get("/api/v1/activities/stats/yearly", headers=headers).json()
+    assert [entry["year"] for entry in yearly] == [2024, 2023]
+    assert yearly[0]["stats"] == {"Distance": 8.0, "Days": 2, "AvgPace": "6'00\"/km", "Routes": 2, "Duration": 1800}
+    assert yearly[1]["stats"]["AvgPace"] == "5'00\"/km"
+    assert len(yearly[0]["activities"]) == 2
+
+def test_stats_rollups_follow_writes():
+    """Test that stats rollups track create, update and delete"""
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    def overview():
+        return client.get("/api/v1/activities/stats/overview", headers=headers).json()
+    
+    first = {"date": "2024-03-01T07:00:00", "distance": 5.0, "time": "25m", "route": "Park", "activity_type": "run"}
+    second = {"date": "2024-03-01T18:00:00", "distance": 3.0, "route": "Park", "activity_type": "run"}
+    first_id = client.post("/api/v1/activities/", json=first, headers=headers).json()["id"]
+    second_id = client.post("/api/v1/activities/", json=second, headers=headers).json()["id"]
+    assert overview() == {"Distance": 8.0, "Days": 1, "AvgPace": "5'00\"/km", "Routes": 1, "Duration": 1500}
+    
+    client.put(f"/api/v1/activities/{second_id}", json={"date": "2023-12-31T18:00:00", "route": "Hill"}, headers=headers)
+    assert overview() == {"Distance": 8.0, "Days": 2, "AvgPace": "5'00\"/km", "Routes": 2, "Duration": 1500}
+    yearly = client.get("/api/v1/activities/stats/yearly", headers=headers).json()
+    assert [(entry["year"], entry["stats"]["Distance"], entry["stats"]["Routes"]) for entry in yearly] == [(2024, 5.0, 1), (2023, 3.0, 1)]
+    
+    client.delete(f"/api/v1/activities/{first_id}", headers=headers)
+    assert overview() == {"Distance": 3.0, "Days": 1, "AvgPace": "0'00\"/km", "Routes": 1, "Duration": 0}
+    
+    client.delete(f"/api/v1/activities/{second_id}", headers=headers)
+    assert overview() == {"Distance": 0.0, "Days": 0, "AvgPace": "0'00\"/km", "Routes": 0, "Duration": 0}
+    assert client.get("/api/v1/activities/stats/yearly", headers=headers).json() == []
+
+def test_stats_rollups_bucket_offset_dates_by_utc_day():
+    """Test that a date with a UTC offset is counted on its UTC day and fully removed on delete"""
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    activity = {"date": "2024-05-01T01:00:00+02:00", "distance": 5.0, "activity_type": "run"}
+    response = client.post("/api/v1/activities/", json=activity, headers=headers)
+    assert response.json()["date"].startswith("2024-04-30T23:00:00")
+    daily = client.get("/api/v1/activities/stats/daily?year=2024", headers=headers).json()
+    # Day 120 of the leap year is April 30th
+    assert daily["activity_count"][120] == 1 and sum(daily["activity_count"]) == 1
+    
+    client.delete(f"/api/v1/activities/{response.json()['id']}", headers=headers)
+    assert client.get("/api/v1/activities/stats/overview", headers=headers).json()["Days"] == 0
+    assert sum(client.get("/api/v1/activities/stats/daily?year=2024", headers=headers).json()["activity_count"]) == 0
+
+def test_daily_stats():
+    """Test the dense per-day distance and count arrays"""
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    for day, distance in (("2024-01-01T07:00:00", 5.0), ("2024-01-01T18:00:00", 2.5), ("2024-12-31T07:00:00", 10.0), ("2023-06-01T07:00:00", 4.0)):
+        client.post("/api/v1/activities/", json={"date": day, "distance": distance, "activity_type": "run"}, headers=headers)
+    
+    daily = client.get("/api/v1/activities/stats/daily?year=2024", headers=headers).json()
+    assert daily["year"] == 2024
+    assert len(daily["distance"]) == len(daily["activity_count"]) == 366
+    assert (daily["distance"][0], daily["activity_count"][0]) == (7.5, 2)
+    assert (daily["distance"][365], daily["activity_count"][365]) == (10.0, 1)
+    assert sum(daily["activity_count"]) == 3
+    
+    assert len(client.get("/api/v1/activities/stats/daily?year=2023", headers=headers).json()["distance"]) == 365
+    assert client.get("/api/v1/activities/stats/daily", headers=headers).status_code == 422
+
+def test_rebuild_rollups_repairs_drift():
+    """Test that rebuilding recomputes rollups from the activities"""
+    from database import SessionLocal
+    from models import ActivityRollup
+    from rollups import rebuild_rollups
+    from etags import bump_data_version
+    
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    batch = {"activities": [
+        {"date": f"2024-05-{day:02d}T10:00:00", "distance": 4.0, "time": "20m", "route": f"R{day % 2}", "activity_type": "run"}
+        for day in range(1, 11)
+    ]}
+    result = client.post("/api/v1/activities/batch", json=batch, headers=headers).json()
+    expected = {"Distance": 40.0, "Days": 10, "AvgPace": "5'00\"/km", "Routes": 2, "Duration": 12000}
+    assert client.get("/api/v1/activities/stats/overview", headers=headers).json() == expected
+    
+    activity = client.get(f"/api/v1/activities/{result['results'][0]['id']}", headers=headers).json()
+    db = SessionLocal()
+    try:
+        db.query(ActivityRollup).filter(ActivityRollup.user_id == activity["user_id"]).update({"distance": 999.0})
+        # Out-of-band edits must bump the version for cached stats to notice
+        bump_data_version(db, activity["user_id"])
+        db.commit()
+        assert client.get("/api/v1/activities/stats/overview", headers=headers).json()["Distance"] != 40.0
+        
+        assert rebuild_rollups(db, user_id=activity["user_id"]) == 1
+        bump_data_version(db, activity["user_id"])
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/api/v1/activities/stats/overview", headers=headers).json() == expected
+
+def test_yearly_stats_query_count_and_limits():
+    """Test that yearly stats use a fixed number of queries and limit embedded activities"""
+    from sqlalchemy import event
+    from database import async_engine, engine
+    
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    batch = {"activities": [
+        {
+            "date": f"{year}-0{month}-10T10:00:00",
+            "distance": 5.0,
+            "activity_type": "run",
+            "coordinates": [{"lat": 40.7 + i * 1e-4, "lng": -74.0} for i in range(5)]
+        }
+        for year in range(2012, 2024) for month in (1, 2, 3)
+    ]}
+    assert client.post("/api/v1/activities/batch", json=batch, headers=headers).json()["created"] == 36
+    
+    statements = []
+    def count_statement(*args):
+        statements.append(args)
+    # The version is read on the async engine, the rest in the threadpool on the sync one
+    for bind in (engine, async_engine.sync_engine):
+        event.listen(bind, "before_cursor_execute", count_statement)
+    try:
+        response = client.get("/api/v1/activities/stats/yearly?activities_per_year=2", headers=headers)
+    finally:
+        for bind in (engine, async_engine.sync_engine):
+            event.remove(bind, "before_cursor_execute", count_statement)
+    
+    yearly = response.json()
+    assert [entry["year"] for entry in yearly] == list(range(2023, 2011, -1))
+    assert all(entry["activity_count"] == 3 for entry in yearly)
+    assert [a["date"][:7] for a in yearly[0]["activities"]] == ["2023-03", "2023-02"]
+    assert "coordinates" not in yearly[0]["activities"][0]
+    # Data version, year rollups, route counts and activities, independent of the number of years
+    assert 4 <= len(statements) <= 5
+    
+    yearly = client.get("/api/v1/activities/stats/yearly?activities_per_year=0", headers=headers).json()
+    assert all(entry["activities"] == [] for entry in yearly)
+    
+    yearly = client.get("/api/v1/activities/stats/yearly?activities_per_year=1&resolution=full", headers=headers).json()
+    assert len(yearly[-1]["activities"][0]["coordinates"]) == 5
+
+def test_yearly_stats_embed_activities_by_utc_year():
+    """Test that activities near New Year are embedded in the same year as their stats"""
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # 2023-12-31T23:30:00Z, and one on each side
+    for day in ("2024-01-01T00:30:00+01:00", "2024-01-01T08:00:00", "2023-12-31T08:00:00"):
+        client.post("/api/v1/activities/", json={"date": day, "distance": 1.0, "activity_type": "run"}, headers=headers)
+    
+    yearly = client.get("/api/v1/activities/stats/yearly?activities_per_year=5", headers=headers).json()
+    assert [(entry["year"], entry["activity_count"], len(entry["activities"])) for entry in yearly] == [(2024, 1, 1), (2023, 2, 2)]
+    assert [a["date"][:16] for a in yearly[1]["activities"]] == ["2023-12-31T23:30", "2023-12-31T08:00"]
+
+def test_read_activities_cursor_pagination():
+    """Test walking activities newest first with keyset cursors"""
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # Two activities share each date so ties are broken by id
+    batch = {"activities": [
+        {"date": f"2024-02-{day:02d}T10:00:00", "distance": 5.0, "activity_type": "run"}
+        for day in range(1, 13) for _ in range(2)
+    ]}
+    created = client.post("/api/v1/activities/batch", json=batch, headers=headers).json()
+    expected = [r["id"] for r in created["results"]][::-1]
+    
+    seen = []
+    cursor = None
+    for _ in range(10):
+        params = {"limit": 5}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/v1/activities/", params=params, headers=headers)
+        assert response.status_code == 200
+        seen.extend(a["id"] for a in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        # New activities don't shift later pages
+        client.post("/api/v1/activities/", json={"date": "2025-01-01T10:00:00", "distance": 1.0, "activity_type": "run"}, headers=headers)
+    
+    assert seen == expected
+    
+    offset_page = client.get("/api/v1/activities/?limit=3&skip=5", headers=headers).json()
+    assert [a["id"] for a in offset_page] == expected[1:4]
+    
+    response = client.get("/api/v1/activities/?cursor=not-a-cursor", headers=headers)
+    assert response.status_code == 400
+
+def test_read_activities_fields_and_include():
+    """Test field projection and opt-in coordinates on activity reads"""
+    from sqlalchemy import event
+    from database import async_engine, engine
+    
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    batch = {"activities": [
+        {
+            "date": f"2024-03-{day:02d}T10:00:00",
+            "distance": 5.0,
+            "activity_type": "run",
+            "coordinates": [{"lat": 40.7 + i * 1e-4, "lng": -74.0} for i in range(5)]
+        }
+        for day in range(1, 11)
+    ]}
+    client.post("/api/v1/activities/batch", json=batch, headers=headers)
+    
+    def read(url):
+        statements = []
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+        # Rows come from the async engine, tracks from the sync one in the threadpool
+        for bind in (engine, async_engine.sync_engine):
+            event.listen(bind, "before_cursor_execute", capture)
+        try:
+            response = client.get(url, headers=headers)
+        finally:
+            for bind in (engine, async_engine.sync_engine):
+                event.remove(bind, "before_cursor_execute", capture)
+        return response, statements
+    
+    response, statements = read("/api/v1/activities/?fields=date,distance&limit=4")
+    assert response.status_code == 200
+    assert all(set(a) == {"id", "date", "distance"} for a in response.json())
+    assert response.headers["X-Next-Cursor"]
+    listed = next(s for s in statements if "ORDER BY activities.date DESC" in s)
+    assert "activities.pace" not in listed and "activities.splits" not in listed
+    
+    # Coordinates are never touched unless asked for
+    response, statements = read("/api/v1/activities/?limit=10")
+    assert not any("coordinates" in a for a in response.json())
+    assert not any("activity_routes" in s or "track_data" in s for s in statements)
+    
+    # ...and then cost a fixed number of queries for the whole page
+    _, few = read("/api/v1/activities/?include=coordinates&limit=2")
+    response, many = read("/api/v1/activities/?include=coordinates&limit=10")
+    assert all(len(a["coordinates"]) == 5 for a in response.json())
+    assert len(many) == len(few)
+    
+    first = response.json()[0]["id"]
+    activity = client.get(f"/api/v1/activities/{first}?fields=distance&include=coordinates", headers=headers).json()
+    assert set(activity) == {"id", "distance", "coordinates"}
+    assert len(activity["coordinates"]) == 5
+    
+    assert client.get("/api/v1/activities/?fields=nope", headers=headers).status_code == 422
+    assert client.get("/api/v1/activities/?include=nope", headers=headers).status_code == 422
+
+def test_export_activities_ndjson():
+    """Test streaming a user's full history as NDJSON"""
+    import json
+    from config import settings
+    
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # More activities than one export batch
+    count = settings.EXPORT_BATCH_SIZE + 5
+    batch = {"activities": [
+        {
+            "date": (datetime(2020, 1, 1) + timedelta(days=i)).isoformat(),
+            "distance": 5.0,
+            "activity_type": "run",
+            "coordinates": [{"lat": 40.7 + j * 1e-4, "lng": -74.0} for j in range(3)] if i % 2 else []
+        }
+        for i in range(count)
+    ]}
+    created = client.post("/api/v1/activities/batch", json=batch, headers=headers).json()
+    assert created["created"] == count
+    
+    response = client.get("/api/v1/activities/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [a["id"] for a in lines] == [r["id"] for r in created["results"]]
+    assert not any("coordinates" in a for a in lines)
+    
+    response = client.get("/api/v1/activities/export?include=coordinates", headers=headers)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [len(a["coordinates"]) for a in lines[:4]] == [0, 3, 0, 3]
+    assert len(lines) == count
+
+def test_conditional_get_with_etags():
+    """Test that reads answer If-None-Match with 304 until the user writes"""
+    from sqlalchemy import event
+    from database import async_engine, engine
+    
+    token = test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"date": "2024-01-15T10:00:00", "distance": 5.0, "time": "26m 40s", "activity_type": "run"}
+    activity = client.post("/api/v1/activities/", json=payload, headers=headers).json()
+    
+    for url in ["/api/v1/activities/stats/overview", "/api/v1/activities/stats/yearly", "/api/v1/activities/?limit=5", f"/api/v1/activities/{activity['id']}"]:
+        response = client.get(url, headers=headers)
+        etag = response.headers["ETag"]
+        
+        statements = []
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+        for bind in (engine, async_engine.sync_engine):
+            event.listen(bind, "before_cursor_execute", capture)
+        try:
+            response = client.get(url, headers={**headers, "If-None-Match": etag})
+        finally:
+            for bind in (engine, async_engine.sync_engine):
+                event.remove(bind, "before_cursor_execute", capture)
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        # Only the data version lookup; the user comes from the principal cache
+        assert len(statements) == 1
+    
+    overview = "/api/v1/activities/stats/overview"
+    etag = client.get(overview, headers=headers).headers["ETag"]
+    assert client.get("/api/v1/activities/stats/yearly", headers=headers).headers["ETag"] != etag
+    
+    # Every write invalidates
+    client.put(f"/api/v1/activities/{activity['id']}", json={"distance": 7.0}, headers=headers)
+    response = client.get(overview, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    client.delete(f"/api/v1/activities/{activity['id']}", headers=headers)
+    assert client.get(overview, headers={**headers, "If-None-Match": etag}).status_code == 200
+    
+    # Another user's tag never matches
+    other = {"Authorization": f"Bearer {test_user_login()}"}
+    assert client.get(overview, headers={**other, "If-None-Match": etag}).status_code == 200
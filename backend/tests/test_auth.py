@@ -0,0 +1,60 @@
+"""Tests for password hashing and login"""
+
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import auth
+from main import app
+from config import settings
+from database import SessionLocal
+from models import User as UserModel
+
+client = TestClient(app)
+
+def test_login_rehashes_on_cost_change(monkeypatch):
+    """Test that logging in upgrades a hash made with other argon2 costs"""
+    # Start from cheap costs so the test stays fast
+    monkeypatch.setattr(settings, "ARGON2_TIME_COST", 1)
+    monkeypatch.setattr(settings, "ARGON2_MEMORY_COST", 1024)
+    monkeypatch.setattr(auth, "pwd_context", None)
+    username = f"rehash_{uuid.uuid4().hex[:8]}"
+    user = {"email": f"{username}@example.com", "username": username, "password": "test123"}
+    assert client.post("/api/v1/users/", json=user).status_code == 201
+    
+    def stored_hash():
+        db = SessionLocal()
+        try:
+            return db.query(UserModel.hashed_password).filter(UserModel.username == username).scalar()
+        finally:
+            db.close()
+    
+    old_hash = stored_hash()
+    assert "m=1024,t=1" in old_hash
+    
+    monkeypatch.setattr(settings, "ARGON2_TIME_COST", 2)
+    monkeypatch.setattr(settings, "ARGON2_MEMORY_COST", 2048)
+    monkeypatch.setattr(auth, "pwd_context", None)
+    assert client.post("/api/v1/auth/login", data={"username": username, "password": "wrong"}).status_code == 401
+    assert stored_hash() == old_hash
+    
+    assert client.post("/api/v1/auth/login", data={"username": username, "password": "test123"}).status_code == 200
+    new_hash = stored_hash()
+    assert "m=2048,t=2" in new_hash
+    assert asyncio.run(auth.verify_and_update_password("test123", new_hash)) == (True, None)
+    
+    # Already current: left alone
+    assert client.post("/api/v1/auth/login", data={"username": username, "password": "test123"}).status_code == 200
+    assert stored_hash() == new_hash
+
+def test_auth_cache_ttl_is_bounded():
+    """Test that the principal cache TTL, how long other processes may serve a changed user, is capped"""
+    from pydantic import ValidationError
+    from config import Settings
+
+    assert Settings(AUTH_CACHE_TTL_SECONDS=0).AUTH_CACHE_TTL_SECONDS == 0
+    with pytest.raises(ValidationError):
+        Settings(AUTH_CACHE_TTL_SECONDS=3600)
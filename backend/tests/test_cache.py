@@ -0,0 +1,93 @@
+"""Tests for the stats response cache and the principal cache"""
+
+from fastapi.testclient import TestClient
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+from cache import MemoryBackend
+from tests import test_activities
+
+client = TestClient(app)
+
+def test_memory_backend_lru_and_ttl(monkeypatch):
+    """Test LRU eviction, expiry and per-user invalidation"""
+    now = [1000.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    backend = MemoryBackend(max_entries=2, ttl=60)
+    
+    backend.set((1, "a"), b"1a")
+    backend.set((1, "b"), b"1b")
+    assert backend.get((1, "a")) == b"1a"
+    backend.set((2, "a"), b"2a")
+    # (1, "b") was least recently used
+    assert backend.get((1, "b")) is None
+    assert backend.get((1, "a")) == b"1a"
+    assert backend.evictions == 1
+    
+    backend.invalidate(1)
+    assert backend.get((1, "a")) is None
+    assert backend.get((2, "a")) == b"2a"
+    
+    now[0] += 61
+    assert backend.get((2, "a")) is None
+    assert len(backend) == 0
+
+def test_stats_cache_hits_and_invalidation():
+    """Test that stats are served from the cache until the user writes"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    activity = {"date": "2024-01-15T10:00:00", "distance": 5.0, "time": "25m", "activity_type": "run"}
+    created = client.post("/api/v1/activities/", json=activity, headers=headers).json()
+    
+    before = client.get("/metrics").json()["stats_cache"]
+    first = client.get("/api/v1/activities/stats/overview", headers=headers)
+    second = client.get("/api/v1/activities/stats/overview", headers=headers)
+    after = client.get("/metrics").json()["stats_cache"]
+    assert first.json() == second.json() == {"Distance": 5.0, "Days": 1, "AvgPace": "5'00\"/km", "Routes": 0, "Duration": 1500}
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+    assert second.headers["ETag"] == first.headers["ETag"]
+    
+    client.put(f"/api/v1/activities/{created['id']}", json={"distance": 10.0}, headers=headers)
+    assert client.get("/api/v1/activities/stats/overview", headers=headers).json()["Distance"] == 10.0
+    
+    yearly = client.get("/api/v1/activities/stats/yearly", headers=headers).json()
+    assert client.get("/api/v1/activities/stats/yearly?activities_per_year=0", headers=headers).json() != yearly
+    client.delete(f"/api/v1/activities/{created['id']}", headers=headers)
+    assert client.get("/api/v1/activities/stats/yearly", headers=headers).json() == []
+    assert client.get("/metrics").json()["stats_cache"]["invalidations"] >= before["invalidations"] + 2
+
+def test_principal_cache_skips_user_queries():
+    """Test that authenticated requests reuse the resolved user until it changes"""
+    from sqlalchemy import event
+    from database import async_engine, engine
+    from auth import create_access_token
+    
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    me = client.get("/api/v1/users/me", headers=headers).json()
+    
+    statements = []
+    def count_statement(*args):
+        statements.append(args)
+    before = client.get("/metrics").json()["auth_cache"]
+    for bind in (engine, async_engine.sync_engine):
+        event.listen(bind, "before_cursor_execute", count_statement)
+    try:
+        assert client.get("/api/v1/users/me", headers=headers).json() == me
+    finally:
+        for bind in (engine, async_engine.sync_engine):
+            event.remove(bind, "before_cursor_execute", count_statement)
+    assert statements == []
+    assert client.get("/metrics").json()["auth_cache"]["hits"] == before["hits"] + 1
+    
+    client.put("/api/v1/users/me", json={"full_name": "Renamed"}, headers=headers)
+    assert client.get("/api/v1/users/me", headers=headers).json()["full_name"] == "Renamed"
+    
+    # Tokens without the user id still resolve by username
+    legacy = create_access_token({"sub": me["username"]})
+    assert client.get("/api/v1/users/me", headers={"Authorization": f"Bearer {legacy}"}).json()["id"] == me["id"]
+    
+    client.put("/api/v1/users/me", json={"is_active": False}, headers=headers)
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 400
@@ -0,0 +1,45 @@
+"""Tests for duration and pace parsing/formatting"""
+
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from formatting import format_pace, format_pace_seconds, pace_seconds_per_km, parse_duration, parse_pace
+
+@pytest.mark.parametrize("text,seconds", [
+    ("1h 23m", 4980),
+    ("26m 40s", 1600),
+    ("30m", 1800),
+    ("45s", 45),
+    ("1h", 3600),
+    ("2h 5m 3s", 7503),
+    ("1:23:45", 5025),
+    ("26:40", 1600),
+    ("30", 1800),
+    (" 1H 0M ", 3600),
+])
+def test_parse_duration(text, seconds):
+    """Test the duration formats clients send"""
+    assert parse_duration(text) == seconds
+
+@pytest.mark.parametrize("text", ["", "fast", "1h 23", "1:2:3:4", "m30"])
+def test_parse_duration_invalid(text):
+    """Test that unparseable durations raise"""
+    with pytest.raises(ValueError):
+        parse_duration(text)
+
+def test_parse_pace():
+    """Test pace strings round trip through seconds per km"""
+    assert parse_pace("5'20\"/km") == 320
+    assert parse_pace("5:20") == 320
+    assert parse_pace("4'05\"") == 245
+    assert parse_pace(format_pace_seconds(320)) == 320
+    with pytest.raises(ValueError):
+        parse_pace("quick")
+
+def test_pace_seconds_per_km():
+    """Test numeric pace from distance and duration"""
+    assert pace_seconds_per_km(5.0, 1600) == 320
+    assert pace_seconds_per_km(0, 1600) is None
+    assert pace_seconds_per_km(5.0, None) is None
+    assert format_pace(5.0, 1600) == "5'20\"/km"
@@ -0,0 +1,85 @@
+"""Tests for the track point heatmap"""
+
+from fastapi.testclient import TestClient
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from main import app
+from tracks.heatmap import bin_points, heatmap_cache
+from tests import test_activities
+
+client = TestClient(app)
+
+def track(lat, lng, points=20, step=1e-3):
+    return [{"lat": lat + i * step, "lng": lng + i * step} for i in range(points)]
+
+def test_bin_points():
+    """Test that points land in the right cells, north row first"""
+    lat = np.array([0.5, 0.5, -0.5, 1.0, 5.0])
+    lng = np.array([-0.5, -0.5, 0.5, 1.0, 0.0])
+    counts = bin_points(lat, lng, (-1.0, -1.0, 1.0, 1.0), 2, 2)
+    # Two points north-west, one south-east, one on the north-east corner, one outside
+    assert counts.tolist() == [2, 1, 0, 1]
+
+def test_heatmap_endpoint_incremental():
+    """Test heatmap counts, incremental updates and rebuilds"""
+    heatmap_cache.clear()
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    url = "/api/v1/activities/heatmap?min_lat=40&min_lng=-75&max_lat=41&max_lng=-73&width=64&height=32"
+
+    def create(lat, lng):
+        activity = {"date": "2024-05-01T07:00:00", "distance": 2.0, "activity_type": "run", "coordinates": track(lat, lng)}
+        return client.post("/api/v1/activities/", json=activity, headers=headers).json()
+
+    def total():
+        body = client.get(url, headers=headers).json()
+        assert (body["width"], body["height"]) == (64, 32)
+        assert len(body["counts"]) == 64 * 32
+        return sum(body["counts"])
+
+    first = create(40.70, -74.00)
+    assert total() == 20
+    assert heatmap_cache.metrics()["full_builds"] == 1
+
+    # Outside the bounds: nothing to add. Inside: only the new points are binned
+    create(48.85, 2.35)
+    assert total() == 20
+    create(40.50, -74.50)
+    assert total() == 40
+    metrics = client.get("/metrics").json()["heatmap_cache"]
+    assert (metrics["full_builds"], metrics["incremental_updates"]) == (1, 1)
+
+    # Deleting an activity rebuilds
+    client.delete(f"/api/v1/activities/{first['id']}", headers=headers)
+    assert total() == 20
+    assert heatmap_cache.metrics()["full_builds"] == 2
+
+    response = client.get(url + "&format=png", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG\r\n\x1a\n")
+
+    assert client.get("/api/v1/activities/heatmap?min_lat=10&max_lat=5", headers=headers).status_code == 422
+    assert client.get("/api/v1/activities/heatmap?width=100000", headers=headers).status_code == 422
+
+def test_heatmap_rebuilds_after_track_edit_within_bounds():
+    """Test that moving points inside the same bounding box, with the same point count, rebuilds the heatmap"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    url = "/api/v1/activities/heatmap?min_lat=40&min_lng=-75&max_lat=41&max_lng=-73&width=64&height=32"
+    corners = [{"lat": 40.1, "lng": -74.9}, {"lat": 40.9, "lng": -73.1}]
+
+    activity = {"date": "2024-05-01T07:00:00", "distance": 2.0, "activity_type": "run", "coordinates": corners + [{"lat": 40.1, "lng": -73.1}]}
+    activity_id = client.post("/api/v1/activities/", json=activity, headers=headers).json()["id"]
+    counts = client.get(url, headers=headers).json()["counts"]
+    # South-east corner, then north-west corner
+    assert (counts[28 * 64 + 60], counts[3 * 64 + 3]) == (1, 0)
+    full_builds = heatmap_cache.metrics()["full_builds"]
+
+    moved = {"coordinates": corners + [{"lat": 40.9, "lng": -74.9}]}
+    assert client.put(f"/api/v1/activities/{activity_id}", json=moved, headers=headers).status_code == 200
+    counts = client.get(url, headers=headers).json()["counts"]
+    assert (counts[28 * 64 + 60], counts[3 * 64 + 3]) == (0, 1)
+    assert heatmap_cache.metrics()["full_builds"] == full_builds + 1
@@ -0,0 +1,191 @@
+"""Tests for background import jobs"""
+
+import pytest
+import sys
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+from config import settings
+import jobs
+from replicas import recent_writers
+from tests import test_activities
+from tests.test_tracks import GPX_SAMPLE
+from database import SessionLocal
+from models import ImportJob as ImportJobModel, ImportJobStatus
+
+client = TestClient(app)
+
+def wait_for_job(job_id, headers, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get(f"/api/v1/imports/{job_id}", headers=headers)
+        assert response.status_code == 200
+        job = response.json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f"Import job {job_id} did not finish in {timeout}s")
+
+@pytest.fixture(scope="module", autouse=True)
+def worker_pool():
+    yield
+    jobs.shutdown()
+
+@pytest.fixture(autouse=True)
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_SPOOL_DIR", str(tmp_path))
+    return tmp_path
+
+def test_import_job_creates_activity(spool_dir):
+    """Test that an import returns a job id at once and completes in the background"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post(
+        "/api/v1/imports/",
+        files={"file": ("run.gpx", GPX_SAMPLE, "application/gpx+xml")},
+        data={"activity_type": "run", "route": "River Loop"},
+        headers=headers
+    )
+
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] in ("queued", "running", "succeeded")
+
+    job = wait_for_job(job["id"], headers)
+    assert job["status"] == "succeeded"
+    assert job["error"] is None
+
+    response = client.get(f"/api/v1/activities/{job['activity_id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["route"] == "River Loop"
+    assert response.json()["distance"] == pytest.approx(2.0, abs=0.01)
+
+    # The spooled upload is cleaned up once the job is done
+    assert list(spool_dir.iterdir()) == []
+
+    # The API process, not the worker, records the write for read routing
+    user_id = client.get("/api/v1/users/me", headers=headers).json()["id"]
+    deadline = time.monotonic() + 5
+    while not recent_writers.is_recent(user_id) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert recent_writers.is_recent(user_id)
+
+def test_deleting_imported_activity_unlinks_job(spool_dir):
+    """Test that deleting an imported activity clears the job's activity_id"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post(
+        "/api/v1/imports/",
+        files={"file": ("run.gpx", GPX_SAMPLE, "application/gpx+xml")},
+        data={"activity_type": "run"},
+        headers=headers
+    )
+    job = wait_for_job(response.json()["id"], headers)
+    assert job["status"] == "succeeded"
+
+    assert client.delete(f"/api/v1/activities/{job['activity_id']}", headers=headers).status_code == 204
+    job = client.get(f"/api/v1/imports/{job['id']}", headers=headers).json()
+    assert job["status"] == "succeeded"
+    assert job["activity_id"] is None
+
+def test_import_job_reports_parse_errors():
+    """Test that a file that fails to parse marks the job as failed"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post(
+        "/api/v1/imports/",
+        files={"file": ("broken.gpx", b"<gpx><trk>", "application/gpx+xml")},
+        data={"activity_type": "run"},
+        headers=headers
+    )
+    assert response.status_code == 202
+
+    job = wait_for_job(response.json()["id"], headers)
+    assert job["status"] == "failed"
+    assert "Invalid XML" in job["error"]
+    assert job["activity_id"] is None
+
+def test_import_job_rejects_unknown_format():
+    """Test that unsupported files are rejected before a job is created"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post(
+        "/api/v1/imports/",
+        files={"file": ("notes.txt", b"hello", "text/plain")},
+        data={"activity_type": "run"},
+        headers=headers
+    )
+
+    assert response.status_code == 400
+
+def test_import_job_is_private():
+    """Test that users can't see each other's import jobs"""
+    owner = {"Authorization": f"Bearer {test_activities.test_user_login()}"}
+    other = {"Authorization": f"Bearer {test_activities.test_user_login()}"}
+
+    response = client.post(
+        "/api/v1/imports/",
+        files={"file": ("run.gpx", GPX_SAMPLE, "application/gpx+xml")},
+        data={"activity_type": "run"},
+        headers=owner
+    )
+    job_id = response.json()["id"]
+
+    assert client.get(f"/api/v1/imports/{job_id}", headers=other).status_code == 404
+    assert [job["id"] for job in client.get("/api/v1/imports/", headers=owner).json()] == [job_id]
+    wait_for_job(job_id, owner)
+
+def test_import_job_is_claimed_once(spool_dir):
+    """Test that only one worker can claim a queued job"""
+    token = test_activities.test_user_login()
+    user_id = client.get("/api/v1/users/me", headers={"Authorization": f"Bearer {token}"}).json()["id"]
+    job_id = os.urandom(16).hex()
+    db = SessionLocal()
+    try:
+        db.add(ImportJobModel(
+            id=job_id, user_id=user_id, file_format="gpx",
+            file_path=str(spool_dir / "missing.gpx"), activity_type="run"
+        ))
+        db.commit()
+        assert jobs.claim_job(db, job_id)
+        assert not jobs.claim_job(db, job_id)
+        # A job another worker holds is left alone
+        jobs.run_import_job(job_id)
+        db.expire_all()
+        assert db.get(ImportJobModel, job_id).status == ImportJobStatus.RUNNING
+    finally:
+        db.close()
+
+def test_queued_and_stale_jobs_are_picked_up(spool_dir):
+    """Test that jobs left queued or running past their lease are run, and live ones left alone"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/api/v1/users/me", headers=headers).json()["id"]
+    now = datetime.now(timezone.utc)
+    started = {"queued": None, "stale": now - timedelta(hours=2), "live": now}
+    job_ids = {name: os.urandom(16).hex() for name in started}
+
+    db = SessionLocal()
+    try:
+        for name, started_at in started.items():
+            path = spool_dir / f"{job_ids[name]}.gpx"
+            path.write_bytes(GPX_SAMPLE)
+            db.add(ImportJobModel(
+                id=job_ids[name], user_id=user_id, file_format="gpx", file_path=str(path), activity_type="run",
+                status=ImportJobStatus.QUEUED if started_at is None else ImportJobStatus.RUNNING, started_at=started_at
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+    assert jobs.submit_queued_jobs() == 2
+    assert wait_for_job(job_ids["queued"], headers)["status"] == "succeeded"
+    assert wait_for_job(job_ids["stale"], headers)["status"] == "succeeded"
+    assert client.get(f"/api/v1/imports/{job_ids['live']}", headers=headers).json()["status"] == "running"
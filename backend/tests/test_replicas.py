@@ -0,0 +1,62 @@
+"""Tests for read replica routing"""
+
+import sqlite3
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+from main import app
+from replicas import RecentWriters, recent_writers
+from tests import test_activities
+
+client = TestClient(app)
+
+@pytest.fixture
+def snapshot_replica(tmp_path, monkeypatch):
+    """Returns a function pointing the read sessions at a snapshot of the database taken then"""
+    def snapshot():
+        path = str(tmp_path / "replica.db")
+        with sqlite3.connect(database.engine.url.database) as source, sqlite3.connect(path) as target:
+            source.backup(target)
+        read_engine, read_async_engine = database.create_engines(f"sqlite:///{path}")
+        monkeypatch.setattr(database, "read_engine", read_engine)
+        monkeypatch.setattr(database, "ReadSessionLocal", database.sessionmaker(autoflush=False, bind=read_engine))
+        monkeypatch.setattr(database, "AsyncReadSessionLocal", database.async_sessionmaker(read_async_engine, autoflush=False, expire_on_commit=False))
+
+    yield snapshot
+    recent_writers.clear()
+
+def test_recent_writers_window():
+    """Test that writes are remembered for the window only"""
+    writers = RecentWriters(60)
+    writers.record(1)
+    assert writers.is_recent(1) and not writers.is_recent(2)
+    expired = RecentWriters(0)
+    expired.record(1)
+    assert not expired.is_recent(1)
+
+def test_reads_stick_to_primary_after_write(snapshot_replica):
+    """Test that a user reads their writes from the primary, then from the replica"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    snapshot_replica()
+    # Written after the snapshot, so only the primary has it
+    activity = {"date": "2024-05-01T07:00:00", "distance": 3.0, "activity_type": "run"}
+    assert client.post("/api/v1/activities/", json=activity, headers=headers).status_code == 201
+
+    before = client.get("/metrics").json()["read_routing"]
+    assert before["replica"] is True
+    response = client.get("/api/v1/activities/", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    after = client.get("/metrics").json()["read_routing"]
+    assert after["primary_reads"] > before["primary_reads"]
+
+    # Once the window is over, reads go to the replica and its older state
+    recent_writers.clear()
+    response = client.get("/api/v1/activities/", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == []
+    assert client.get("/metrics").json()["read_routing"]["replica_reads"] > after["replica_reads"]
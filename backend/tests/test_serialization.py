@@ -0,0 +1,54 @@
+"""Tests that the fast JSON path matches the response models byte for byte"""
+
+from fastapi.testclient import TestClient
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from typing import List
+from pydantic import TypeAdapter
+from main import app
+from database import SessionLocal
+from models import Activity as ActivityModel
+from schemas import Activity, ActivityRouteCoordinate
+from tracks.storage import load_tracks_at
+from tests import test_activities
+
+client = TestClient(app)
+
+def test_activity_list_matches_response_model():
+    """Test that encoded rows equal schemas.Activity serialization"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    batch = {"activities": [
+        {"date": "2024-03-01T06:30:00", "distance": 10.0, "time": "50m", "bpm": 151, "route": "River", "activity_type": "run",
+         "coordinates": [
+             {"lat": 40.7, "lng": -74.0, "elevation": 12.5, "timestamp": "2024-03-01T06:30:00"},
+             {"lat": 40.7001, "lng": -74.0002, "timestamp": "2024-03-01T06:30:01.250"},
+         ]},
+        {"date": "2024-03-02T07:00:00.123456", "distance": 20.5, "activity_type": "cycling"},
+        {"date": "2024-03-03T18:00:00", "distance": 3.0, "pace": "6:10", "activity_type": "workout"},
+    ]}
+    client.post("/api/v1/activities/batch", json=batch, headers=headers)
+    
+    fast = client.get("/api/v1/activities/", headers=headers)
+    fast_full = client.get("/api/v1/activities/?include=coordinates", headers=headers)
+    
+    db = SessionLocal()
+    try:
+        user_id = fast.json()[0]["user_id"]
+        rows = db.query(ActivityModel).filter(ActivityModel.user_id == user_id).order_by(
+            ActivityModel.date.desc(), ActivityModel.id.desc()
+        ).all()
+        models = [Activity.model_validate(row) for row in rows]
+        adapter = TypeAdapter(List[Activity])
+        # Coordinates are left out unless requested
+        assert fast.content == adapter.dump_json(models, exclude={"__all__": {"coordinates"}})
+        
+        tracks = load_tracks_at(db, rows, 0.0)
+        for row, model in zip(rows, models):
+            if row.id in tracks:
+                model.coordinates = [ActivityRouteCoordinate(**point) for point in tracks[row.id].to_coordinates()]
+        assert fast_full.content == adapter.dump_json(models)
+        assert len(fast_full.json()[-1]["coordinates"]) == 2
+    finally:
+        db.close()
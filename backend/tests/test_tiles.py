@@ -0,0 +1,105 @@
+"""Tests for the GeoJSON map tiles"""
+
+from fastapi.testclient import TestClient
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from main import app
+from config import settings
+from tracks.tiles import clip_runs, tile_bounds, tile_range
+from tests import test_activities
+
+client = TestClient(app)
+
+def track(lat, lng, points=50, step=2e-4):
+    return [{"lat": lat + i * step, "lng": lng + i * step} for i in range(points)]
+
+def test_tile_range_contains_point():
+    """Test that the tile covering a point has bounds containing it"""
+    for z in (0, 5, 12, 18):
+        x, y, x_max, y_max = tile_range(z, (40.7128, -74.006, 40.7128, -74.006))
+        assert (x, y) == (x_max, y_max)
+        south, west, north, east = tile_bounds(z, x, y)
+        assert south <= 40.7128 <= north and west <= -74.006 <= east
+
+def test_clip_runs_keeps_crossing_segments():
+    """Test that only runs of segments meeting the box are kept"""
+    lat = np.array([0.0, 0.0, 0.0, 5.0, 5.0, 0.0, 0.0])
+    lng = np.array([-2.0, -0.5, 0.5, 0.5, 0.6, 0.6, 2.0])
+    runs = clip_runs(lat, lng, (-1.0, -1.0, 1.0, 1.0))
+    # Into the box and out north, then back in from the north and out east
+    assert [(r.start, r.stop) for r in runs] == [(0, 4), (4, 7)]
+    assert clip_runs(lat, lng, (10.0, 10.0, 11.0, 11.0)) == []
+
+def test_tiles_endpoint_and_invalidation(monkeypatch, tmp_path):
+    """Test serving, caching and invalidating tiles"""
+    monkeypatch.setattr(settings, "TILE_CACHE_DIR", str(tmp_path))
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    def create(lat, lng):
+        activity = {"date": "2024-05-01T07:00:00", "distance": 2.0, "activity_type": "run", "coordinates": track(lat, lng)}
+        return client.post("/api/v1/activities/", json=activity, headers=headers).json()
+    
+    first = create(40.70, -74.00)
+    z = 14
+    x, y, _, _ = tile_range(z, (40.70, -74.00, 40.70, -74.00))
+    url = f"/api/v1/activities/tiles/{z}/{x}/{y}"
+    
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/geo+json"
+    tile = response.json()
+    assert [f["id"] for f in tile["features"]] == [first["id"]]
+    lines = tile["features"][0]["geometry"]["coordinates"]
+    south, west, north, east = tile_bounds(z, x, y)
+    assert all(len(line) >= 2 for line in lines)
+    assert any(west <= lng <= east and south <= lat <= north for line in lines for lng, lat in line)
+    
+    cached = tmp_path / str(first["user_id"]) / str(z) / str(x) / f"{y}.json"
+    assert cached.exists()
+    
+    # An activity elsewhere leaves the tile cached, one crossing it drops it
+    create(48.85, 2.35)
+    assert cached.exists()
+    second = create(40.701, -74.001)
+    assert not cached.exists()
+    assert {f["id"] for f in client.get(url, headers=headers).json()["features"]} == {first["id"], second["id"]}
+    
+    client.delete(f"/api/v1/activities/{second['id']}", headers=headers)
+    assert not cached.exists()
+    assert [f["id"] for f in client.get(url, headers=headers).json()["features"]] == [first["id"]]
+    
+    # Low zoom tiles hold the whole track in few points
+    x0, y0, _, _ = tile_range(3, (40.70, -74.00, 40.70, -74.00))
+    feature = client.get(f"/api/v1/activities/tiles/3/{x0}/{y0}", headers=headers).json()["features"][0]
+    assert sum(len(line) for line in feature["geometry"]["coordinates"]) <= 3
+    
+    assert client.get(f"/api/v1/activities/tiles/{z}/{2 ** z}/0", headers=headers).status_code == 404
+    assert client.get("/api/v1/activities/tiles/30/0/0", headers=headers).status_code == 422
+
+def test_tile_cache_skips_empty_tiles_and_evicts(monkeypatch, tmp_path):
+    """Test that empty tiles aren't stored and a user's tiles stay within budget"""
+    monkeypatch.setattr(settings, "TILE_CACHE_DIR", str(tmp_path))
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    activity = {"date": "2024-05-01T07:00:00", "distance": 2.0, "activity_type": "run", "coordinates": track(40.70, -74.00)}
+    user_id = client.post("/api/v1/activities/", json=activity, headers=headers).json()["user_id"]
+    
+    def cached_tiles():
+        return sorted(str(p.relative_to(tmp_path / str(user_id))) for p in tmp_path.rglob("*.json"))
+    
+    empty = client.get("/api/v1/activities/tiles/14/0/0", headers=headers)
+    assert empty.status_code == 200
+    assert empty.json() == {"type": "FeatureCollection", "features": []}
+    assert cached_tiles() == []
+    
+    # A budget smaller than one tile keeps only the most recently used one
+    monkeypatch.setattr(settings, "TILE_CACHE_MAX_BYTES_PER_USER", 1)
+    paths = []
+    for z in (10, 12):
+        x, y, _, _ = tile_range(z, (40.70, -74.00, 40.70, -74.00))
+        assert client.get(f"/api/v1/activities/tiles/{z}/{x}/{y}", headers=headers).json()["features"]
+        paths.append(f"{z}/{x}/{y}.json")
+    assert cached_tiles() == [paths[1]]
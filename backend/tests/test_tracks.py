@@ -0,0 +1,511 @@
+"""Tests for track encoding and storage"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from fastapi.testclient import TestClient
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+from config import settings
+from database import SessionLocal
+from models import Activity as ActivityModel, ActivityRoute as ActivityRouteModel
+from schemas import ActivityRouteCoordinate
+from formatting import format_pace
+from tracks.codec import PackedTrack, TrackDecodeError, decode_track, encode_track, track_from_coordinates
+from tracks.metrics import compute_metrics, cumulative_distance_m, elevation_gain_loss, haversine_m
+from tracks.simplify import LOD_LEVELS, douglas_peucker, level_for_tolerance, simplify_track
+from tracks.storage import compute_missing_metrics, load_track, pack_existing_tracks
+from tests import test_activities
+
+client = TestClient(app)
+
+def make_coordinates(count=100, with_elevation=True, with_time=True):
+    start = datetime(2024, 1, 15, 10, 0, 0)
+    return [
+        ActivityRouteCoordinate(
+            lat=40.7128 + i * 0.0001,
+            lng=-74.0060 - i * 0.0001,
+            elevation=(12.5 + i * 0.01) if with_elevation else None,
+            timestamp=(start + timedelta(seconds=i)) if with_time else None
+        )
+        for i in range(count)
+    ]
+
+def test_codec_round_trip():
+    """Test that a packed track decodes back to the original points"""
+    coordinates = make_coordinates()
+    track = decode_track(encode_track(track_from_coordinates(coordinates)))
+
+    assert len(track) == 100
+    np.testing.assert_allclose(track.lat, [c.lat for c in coordinates], atol=1e-7)
+    np.testing.assert_allclose(track.lng, [c.lng for c in coordinates], atol=1e-7)
+    np.testing.assert_allclose(track.elevation, [c.elevation for c in coordinates], atol=0.01)
+    assert track.to_coordinates()[42]["timestamp"] == coordinates[42].timestamp
+
+def test_codec_is_compact():
+    """Test that the packed blob is much smaller than raw float columns"""
+    blob = encode_track(track_from_coordinates(make_coordinates(10000)))
+
+    # 10k points of lat/lng/elevation/timestamp as raw doubles is 320 KB
+    assert len(blob) < 10000 * 8
+
+def test_codec_missing_values():
+    """Test tracks with partially missing elevation and no timestamps"""
+    coordinates = make_coordinates(5, with_time=False)
+    coordinates[2].elevation = None
+    track = decode_track(encode_track(track_from_coordinates(coordinates)))
+
+    assert track.time is None
+    assert np.isnan(track.elevation[2])
+    points = track.to_coordinates()
+    assert points[2]["elevation"] is None
+    assert points[3]["elevation"] == pytest.approx(coordinates[3].elevation)
+
+def test_codec_extreme_longitudes():
+    """Test that deltas across the antimeridian survive integer wrap-around"""
+    coordinates = [ActivityRouteCoordinate(lat=-89.9, lng=-179.9999999), ActivityRouteCoordinate(lat=89.9, lng=179.9999999)]
+    track = decode_track(encode_track(track_from_coordinates(coordinates)))
+
+    np.testing.assert_allclose(track.lng, [-179.9999999, 179.9999999], atol=1e-7)
+    np.testing.assert_allclose(track.lat, [-89.9, 89.9], atol=1e-7)
+
+def test_packed_track_decodes_lazily():
+    """Test that PackedTrack only decodes when arrays are accessed"""
+    track = PackedTrack(encode_track(track_from_coordinates(make_coordinates())))
+
+    assert len(track) == 100
+    assert "_columns" not in track.__dict__
+    assert track.lat[0] == pytest.approx(40.7128)
+    assert "_columns" in track.__dict__
+
+def test_packed_track_rejects_garbage():
+    """Test that invalid blobs raise a decode error"""
+    with pytest.raises(TrackDecodeError):
+        PackedTrack(b"not a track")
+
+def test_create_activity_packed_storage(monkeypatch):
+    """Test that packed storage mode keeps the track on the activity row"""
+    monkeypatch.setattr(settings, "TRACK_STORAGE", "packed")
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    activity_data = {
+        "date": "2024-01-15T10:00:00",
+        "distance": 5.0,
+        "activity_type": "run",
+        "coordinates": [
+            {"lat": 40.7128, "lng": -74.0060, "elevation": 10.0},
+            {"lat": 40.7138, "lng": -74.0050, "elevation": 11.0}
+        ]
+    }
+    response = client.post("/api/v1/activities/", json=activity_data, headers=headers)
+    assert response.status_code == 201
+    activity_id = response.json()["id"]
+
+    db = SessionLocal()
+    try:
+        activity = db.get(ActivityModel, activity_id)
+        rows = db.query(ActivityRouteModel).filter(ActivityRouteModel.activity_id == activity_id).count()
+        track = load_track(db, activity)
+    finally:
+        db.close()
+
+    assert rows == 0
+    assert activity.track_points == 2
+    assert isinstance(track, PackedTrack)
+    np.testing.assert_allclose(track.elevation, [10.0, 11.0])
+
+def test_pack_existing_tracks():
+    """Test the backfill that converts row-stored tracks into blobs"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    activity_data = {
+        "date": "2024-01-15T10:00:00",
+        "distance": 5.0,
+        "activity_type": "run",
+        "coordinates": [{"lat": 40.7128 + i * 0.001, "lng": -74.0060} for i in range(20)]
+    }
+    response = client.post("/api/v1/activities/", json=activity_data, headers=headers)
+    assert response.status_code == 201
+    activity_id = response.json()["id"]
+
+    db = SessionLocal()
+    try:
+        assert pack_existing_tracks(db) >= 1
+        activity = db.get(ActivityModel, activity_id)
+        rows = db.query(ActivityRouteModel).filter(ActivityRouteModel.activity_id == activity_id).count()
+        track = load_track(db, activity)
+    finally:
+        db.close()
+
+    assert rows == 0
+    assert len(track) == 20
+    assert track.lat[19] == pytest.approx(40.7318)
+
+GPX_SAMPLE = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <trk><name>Morning Run</name><trkseg>
+    <trkpt lat="40.7128" lon="-74.0060"><ele>10.0</ele><time>2024-01-15T10:00:00Z</time></trkpt>
+    <trkpt lat="40.7218" lon="-74.0060"><ele>12.0</ele><time>2024-01-15T10:05:00Z</time></trkpt>
+    <trkpt lat="40.7308" lon="-74.0060"><ele>11.0</ele><time>2024-01-15T10:10:00Z</time></trkpt>
+  </trkseg></trk>
+</gpx>"""
+
+TCX_SAMPLE = b"""<?xml version="1.0" encoding="UTF-8"?>
+<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">
+  <Activities><Activity Sport="Running"><Lap><Track>
+    <Trackpoint><Time>2024-01-15T10:00:00Z</Time>
+      <Position><LatitudeDegrees>40.7128</LatitudeDegrees><LongitudeDegrees>-74.0060</LongitudeDegrees></Position>
+      <AltitudeMeters>10.0</AltitudeMeters></Trackpoint>
+    <Trackpoint><Time>2024-01-15T10:01:00Z</Time></Trackpoint>
+    <Trackpoint><Time>2024-01-15T10:05:00Z</Time>
+      <Position><LatitudeDegrees>40.7218</LatitudeDegrees><LongitudeDegrees>-74.0060</LongitudeDegrees></Position>
+      <AltitudeMeters>12.0</AltitudeMeters></Trackpoint>
+  </Track></Lap></Activity></Activities>
+</TrainingCenterDatabase>"""
+
+def make_fit(points):
+    """Build a minimal FIT activity file with one record message per point"""
+    import struct
+    fit_epoch = datetime(1989, 12, 31)
+    definition = struct.pack("<BBBHB", 0x40, 0, 0, 20, 4) + bytes([
+        253, 4, 0x86,  # timestamp
+        0, 4, 0x85,    # position_lat
+        1, 4, 0x85,    # position_long
+        2, 2, 0x84,    # altitude
+    ])
+    records = b""
+    for lat, lng, ele, ts in points:
+        records += struct.pack(
+            "<BIiiH", 0x00,
+            int((ts - fit_epoch).total_seconds()),
+            int(round(lat * 2 ** 31 / 180)),
+            int(round(lng * 2 ** 31 / 180)),
+            int(round((ele + 500) * 5))
+        )
+    data = definition + records
+    header = struct.pack("<BBHI4sH", 14, 0x10, 2100, len(data), b".FIT", 0)
+    return header + data + b"\x00\x00"
+
+def test_iter_gpx():
+    """Test streaming GPX parsing"""
+    import io
+    from tracks.parsers import iter_gpx
+
+    points = list(iter_gpx(io.BytesIO(GPX_SAMPLE)))
+
+    assert len(points) == 3
+    assert points[1].lat == 40.7218
+    assert points[1].elevation == 12.0
+    assert points[2].timestamp.isoformat() == "2024-01-15T10:10:00+00:00"
+
+def test_iter_tcx_skips_points_without_position():
+    """Test TCX parsing ignores samples without a position"""
+    import io
+    from tracks.parsers import iter_tcx
+
+    points = list(iter_tcx(io.BytesIO(TCX_SAMPLE)))
+
+    assert [(p.lat, p.lng) for p in points] == [(40.7128, -74.0060), (40.7218, -74.0060)]
+
+def test_iter_fit():
+    """Test FIT record parsing"""
+    import io
+    from tracks.parsers import iter_fit
+
+    start = datetime(2024, 1, 15, 10, 0, 0)
+    fit = make_fit([(40.7128, -74.0060, 10.0, start), (40.7218, -74.0060, 12.4, start + timedelta(seconds=300))])
+    points = list(iter_fit(io.BytesIO(fit)))
+
+    assert len(points) == 2
+    assert points[1].lat == pytest.approx(40.7218, abs=1e-6)
+    assert points[1].lng == pytest.approx(-74.0060, abs=1e-6)
+    assert points[1].elevation == pytest.approx(12.4)
+    assert points[1].timestamp.replace(tzinfo=None) == start + timedelta(seconds=300)
+
+def test_detect_format():
+    """Test track format detection by extension and content"""
+    import io
+    from tracks.parsers import TrackParseError, detect_format
+
+    assert detect_format("ride.GPX", io.BytesIO(b"")) == "gpx"
+    assert detect_format("upload.bin", io.BytesIO(GPX_SAMPLE)) == "gpx"
+    assert detect_format(None, io.BytesIO(TCX_SAMPLE)) == "tcx"
+    assert detect_format(None, io.BytesIO(make_fit([]))) == "fit"
+    with pytest.raises(TrackParseError):
+        detect_format("notes.txt", io.BytesIO(b"hello"))
+
+def test_upload_gpx_activity():
+    """Test creating an activity from an uploaded GPX file"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post(
+        "/api/v1/activities/upload",
+        files={"file": ("run.gpx", GPX_SAMPLE, "application/gpx+xml")},
+        data={"activity_type": "run", "route": "River Loop"},
+        headers=headers
+    )
+
+    assert response.status_code == 201
+    activity = response.json()
+    assert activity["route"] == "River Loop"
+    assert activity["distance"] == pytest.approx(2.0, abs=0.01)
+    assert activity["time"] == "10m 0s"
+    assert activity["pace"] == format_pace(activity["distance"], 600)
+    assert activity["date"].startswith("2024-01-15T10:00:00")
+
+    db = SessionLocal()
+    try:
+        assert db.get(ActivityModel, activity["id"]).track_points == 3
+    finally:
+        db.close()
+
+def test_upload_offset_times_same_in_both_storage_modes(monkeypatch):
+    """Test that times with a UTC offset are stored as UTC by rows and packed storage alike"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+    gpx = GPX_SAMPLE.replace(b"Z</time>", b"+02:00</time>")
+
+    results = []
+    for mode in ("rows", "packed"):
+        monkeypatch.setattr(settings, "TRACK_STORAGE", mode)
+        response = client.post(
+            "/api/v1/activities/upload",
+            files={"file": ("run.gpx", gpx, "application/gpx+xml")},
+            data={"activity_type": "run"},
+            headers=headers
+        )
+        assert response.status_code == 201
+        activity = response.json()
+        db = SessionLocal()
+        try:
+            track = load_track(db, db.get(ActivityModel, activity["id"]))
+        finally:
+            db.close()
+        results.append((activity["date"][:19], [c["timestamp"].replace(tzinfo=None) for c in track.to_coordinates()]))
+
+    assert results[0] == results[1]
+    assert results[0][0] == "2024-01-15T08:00:00"
+    assert results[0][1][0] == datetime(2024, 1, 15, 8, 0)
+
+def test_upload_fit_activity_packed(monkeypatch):
+    """Test creating an activity from a FIT file with packed storage"""
+    monkeypatch.setattr(settings, "TRACK_STORAGE", "packed")
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    start = datetime(2024, 1, 15, 10, 0, 0)
+    fit = make_fit([(40.7128 + i * 0.0009, -74.0060, 10.0, start + timedelta(seconds=30 * i)) for i in range(21)])
+    response = client.post(
+        "/api/v1/activities/upload",
+        files={"file": ("ride.fit", fit, "application/octet-stream")},
+        data={"activity_type": "cycling"},
+        headers=headers
+    )
+
+    assert response.status_code == 201
+    activity = response.json()
+    assert activity["distance"] == pytest.approx(2.0, abs=0.01)
+
+    db = SessionLocal()
+    try:
+        track = load_track(db, db.get(ActivityModel, activity["id"]))
+    finally:
+        db.close()
+    assert len(track) == 21
+
+def test_upload_invalid_file():
+    """Test that unparseable uploads are rejected"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post(
+        "/api/v1/activities/upload",
+        files={"file": ("run.gpx", b"<gpx><trk><trkseg>", "application/gpx+xml")},
+        data={"activity_type": "run"},
+        headers=headers
+    )
+
+    assert response.status_code == 400
+
+def test_douglas_peucker_drops_collinear_points():
+    """Test that straight runs collapse to their endpoints"""
+    x = np.arange(11, dtype=float)
+    y = np.maximum(x - 5.0, 0.0)
+
+    keep = douglas_peucker(x, y, 0.5)
+    assert list(np.flatnonzero(keep)) == [0, 5, 10]
+    assert douglas_peucker(x, y, 5.0).sum() == 2
+
+def test_douglas_peucker_keeps_loops():
+    """Test that a track returning to its start isn't reduced to one point"""
+    angles = np.linspace(0, 2 * np.pi, 50)
+    keep = douglas_peucker(100 * np.cos(angles), 100 * np.sin(angles), 10.0)
+    assert 4 <= keep.sum() < 50
+
+def test_simplify_track_tolerances():
+    """Test that coarser tolerances keep fewer points of a wiggly track"""
+    i = np.arange(2000)
+    coordinates = [
+        ActivityRouteCoordinate(lat=40.7 + k * 1e-5, lng=-74.0 + 2e-5 * np.sin(k / 5), elevation=10.0)
+        for k in i
+    ]
+    track = track_from_coordinates(coordinates)
+    counts = [len(simplify_track(track, tolerance)) for tolerance in LOD_LEVELS.values()]
+
+    assert counts == sorted(counts, reverse=True)
+    assert counts[0] < len(track)
+    simplified = simplify_track(track, LOD_LEVELS["low"])
+    assert simplified.lat[0] == track.lat[0] and simplified.lat[-1] == track.lat[-1]
+
+def test_level_for_tolerance():
+    """Test picking the stored level for a requested tolerance"""
+    assert level_for_tolerance(None) is None
+    assert level_for_tolerance(0) is None
+    assert level_for_tolerance(1.0) is None
+    assert level_for_tolerance(10.0) == "medium"
+    assert level_for_tolerance(500.0) == "low"
+
+def test_read_activity_resolution():
+    """Test fetching an activity's track at different levels of detail"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    activity_data = {
+        "date": "2024-01-15T10:00:00",
+        "distance": 2.2,
+        "activity_type": "run",
+        "coordinates": [
+            {"lat": 40.7 + k * 1e-5, "lng": -74.0 + 2e-5 * float(np.sin(k / 5)), "elevation": 10.0}
+            for k in range(2000)
+        ]
+    }
+    activity_id = client.post("/api/v1/activities/", json=activity_data, headers=headers).json()["id"]
+
+    plain = client.get(f"/api/v1/activities/{activity_id}", headers=headers).json()
+    full = client.get(f"/api/v1/activities/{activity_id}?resolution=full", headers=headers).json()
+    low = client.get(f"/api/v1/activities/{activity_id}?resolution=low", headers=headers).json()
+    custom = client.get(f"/api/v1/activities/{activity_id}?tolerance=100", headers=headers).json()
+
+    assert "coordinates" not in plain
+    assert len(full["coordinates"]) == 2000
+    assert 2 <= len(low["coordinates"]) < 2000
+    assert len(custom["coordinates"]) == len(low["coordinates"])
+    assert low["coordinates"][0]["lat"] == pytest.approx(40.7)
+
+    listed = client.get("/api/v1/activities/?resolution=medium&limit=1000", headers=headers).json()
+    match = next(a for a in listed if a["id"] == activity_id)
+    assert len(low["coordinates"]) <= len(match["coordinates"]) < 2000
+
+    response = client.get(f"/api/v1/activities/{activity_id}?resolution=tiny", headers=headers)
+    assert response.status_code == 422
+
+def test_haversine_distance():
+    """Test great-circle distances against known values"""
+    # One degree of latitude is ~111.2 km
+    assert haversine_m(0.0, 0.0, 1.0, 0.0) == pytest.approx(111195, rel=1e-3)
+    assert haversine_m(40.0, -74.0, 40.0, -74.0) == 0.0
+    np.testing.assert_allclose(cumulative_distance_m(np.array([0.0, 0.001, 0.002]), np.zeros(3)), [0.0, 111.2, 222.4], atol=0.1)
+
+def test_elevation_gain_ignores_noise():
+    """Test that elevation jitter below the threshold isn't counted"""
+    rng = np.random.default_rng(0)
+    flat = 100.0 + rng.uniform(-1.0, 1.0, 500)
+    assert elevation_gain_loss(flat) == (0.0, 0.0)
+
+    hill = np.concatenate([np.linspace(100, 150, 50), np.linspace(150, 120, 30)]) + rng.uniform(-1.0, 1.0, 80)
+    gain, loss = elevation_gain_loss(hill)
+    assert gain == pytest.approx(50, abs=2.5)
+    assert loss == pytest.approx(30, abs=2.5)
+
+def test_elevation_gain_skips_missing_values():
+    """Test that missing elevations don't break gain/loss"""
+    assert elevation_gain_loss([10.0, np.nan, 20.0, np.nan, 15.0]) == (10.0, 5.0)
+    assert elevation_gain_loss([np.nan, np.nan]) == (0.0, 0.0)
+
+def test_compute_metrics_moving_time_and_splits():
+    """Test elapsed vs moving time and per-km splits on a track with a stop"""
+    # ~2.5 km due north at 4 m/s with a two minute stop at 1.2 km
+    step = 0.00036  # ~40 m of latitude
+    lat = np.arange(63) * step
+    seconds = np.arange(63) * 10.0
+    lat = np.insert(lat, 31, lat[30])
+    seconds = np.insert(seconds + np.where(np.arange(63) > 30, 120, 0), 31, seconds[30] + 120)
+
+    track = track_from_coordinates([
+        ActivityRouteCoordinate(lat=la, lng=0.0, elevation=10.0, timestamp=datetime(2024, 1, 15) + timedelta(seconds=t))
+        for la, t in zip(lat, seconds)
+    ])
+    metrics = compute_metrics(track)
+
+    assert metrics.distance_m == pytest.approx(62 * 40.03, rel=1e-3)
+    assert metrics.elapsed_seconds == 740
+    assert metrics.moving_seconds == 620
+    assert metrics.elevation_gain_m == 0.0
+    assert len(metrics.splits) == 2
+    assert metrics.splits[0] == pytest.approx(250, abs=1)
+    assert metrics.splits[1] == pytest.approx(370, abs=1)
+
+def test_compute_metrics_without_time():
+    """Test that tracks without timestamps only get distance and elevation"""
+    metrics = compute_metrics(track_from_coordinates(make_coordinates(10, with_time=False)))
+
+    assert metrics.distance_m > 0
+    assert metrics.elapsed_seconds is None
+    assert metrics.moving_seconds is None
+    assert metrics.splits is None
+
+def test_create_activity_stores_metrics():
+    """Test that track metrics are computed and stored when an activity is created"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    activity_data = {
+        "date": "2024-01-15T10:00:00",
+        "distance": 5.0,
+        "activity_type": "run",
+        "coordinates": [
+            {"lat": 40.7 + i * 0.0009, "lng": -74.0, "elevation": 10.0 + i, "timestamp": f"2024-01-15T10:{i:02d}:00"}
+            for i in range(21)
+        ]
+    }
+    response = client.post("/api/v1/activities/", json=activity_data, headers=headers)
+    activity = response.json()
+
+    assert activity["distance"] == 5.0
+    assert activity["track_distance"] == pytest.approx(2.0, abs=0.01)
+    assert activity["elevation_gain"] == 20.0
+    assert activity["elevation_loss"] == 0.0
+    assert activity["elapsed_seconds"] == 1200
+    assert activity["moving_seconds"] == 1200
+    assert len(activity["splits"]) == 2
+
+    response = client.put(f"/api/v1/activities/{activity['id']}", json={"coordinates": []}, headers=headers)
+    assert response.json()["track_distance"] is None
+
+def test_compute_missing_metrics():
+    """Test the backfill that derives metrics for existing tracks"""
+    token = test_activities.test_user_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    activity_data = {
+        "date": "2024-01-15T10:00:00",
+        "distance": 1.0,
+        "activity_type": "run",
+        "coordinates": [{"lat": 40.7 + i * 0.0009, "lng": -74.0} for i in range(11)]
+    }
+    activity_id = client.post("/api/v1/activities/", json=activity_data, headers=headers).json()["id"]
+
+    db = SessionLocal()
+    try:
+        db.get(ActivityModel, activity_id).track_distance = None
+        db.commit()
+        assert compute_missing_metrics(db) >= 1
+        db.expire_all()
+        assert db.get(ActivityModel, activity_id).track_distance == pytest.approx(1.0, abs=0.01)
+    finally:
+        db.close()
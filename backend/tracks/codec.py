@@ -0,0 +1,217 @@
+"""Packed binary encoding for GPS tracks.
+
+A track is stored as one blob instead of one row per point:
+
+    header:  magic (4s) | version (B) | flags (B) | point count (I)
+    payload: zlib( lat deltas | lng deltas | [elevation deltas] | [time deltas] )
+
+Latitude/longitude are fixed-point degrees * 1e7 (~1 cm), elevation is
+centimeters and timestamps are epoch milliseconds. Every column is delta
+encoded so the typed arrays are mostly small numbers that compress well.
+Deltas use wrap-around integer arithmetic, so decoding is an exact cumsum.
+"""
+
+import struct
+import zlib
+from datetime import datetime, timezone
+from functools import cached_property
+from typing import List, Optional
+
+import numpy as np
+
+MAGIC = b"VBTK"
+VERSION = 1
+HEADER = struct.Struct("<4sBBI")
+
+FLAG_ELEVATION = 0x01
+FLAG_TIME = 0x02
+
+COORD_SCALE = 1e7
+ELEVATION_SCALE = 100.0
+
+# Sentinels for points that are missing an optional value
+ELEVATION_MISSING = np.iinfo(np.int32).min
+TIME_MISSING = np.iinfo(np.int64).min
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class TrackDecodeError(ValueError):
+    """Raised when a blob is not a valid packed track."""
+
+
+class Track:
+    """A GPS track as parallel NumPy arrays.
+
+    ``elevation`` is float64 meters with NaN for missing values and ``time``
+    is datetime64[ms] (UTC) with NaT for missing values. Either may be None
+    when no point in the track carries it.
+    """
+
+    def __init__(self, lat, lng, elevation=None, time=None):
+        self.lat = lat
+        self.lng = lng
+        self.elevation = elevation
+        self.time = time
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def to_coordinates(self) -> List[dict]:
+        """Convert to the ``ActivityRouteCoordinate`` dict shape."""
+        lat = self.lat.tolist()
+        lng = self.lng.tolist()
+        elevation = self.elevation.tolist() if self.elevation is not None else None
+        times = self.time.astype(object).tolist() if self.time is not None else None
+
+        coordinates = []
+        for i in range(len(lat)):
+            ele = elevation[i] if elevation is not None else None
+            coordinates.append({
+                "lat": lat[i],
+                "lng": lng[i],
+                "elevation": None if ele is None or ele != ele else ele,
+                "timestamp": times[i] if times is not None else None,
+            })
+        return coordinates
+
+
+class PackedTrack(Track):
+    """A track backed by a packed blob, decoded on first attribute access."""
+
+    def __init__(self, blob: bytes):
+        if len(blob) < HEADER.size:
+            raise TrackDecodeError("Blob too short for a track header")
+        magic, version, flags, count = HEADER.unpack_from(blob)
+        if magic != MAGIC or version != VERSION:
+            raise TrackDecodeError("Unsupported track encoding")
+        self._blob = blob
+        self._flags = flags
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    @cached_property
+    def _columns(self):
+        return _decode_payload(self._blob[HEADER.size:], self._flags, self._count)
+
+    @property
+    def lat(self):
+        return self._columns[0]
+
+    @property
+    def lng(self):
+        return self._columns[1]
+
+    @property
+    def elevation(self):
+        return self._columns[2]
+
+    @property
+    def time(self):
+        return self._columns[3]
+
+
+def _to_epoch_ms(value: Optional[datetime]) -> int:
+    if value is None:
+        return TIME_MISSING
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(round((value - _EPOCH).total_seconds() * 1000))
+
+
+def _delta(values: np.ndarray) -> np.ndarray:
+    # Array subtraction wraps around on overflow; the cumsum in decode wraps back
+    out = np.empty_like(values)
+    if len(values):
+        out[0] = values[0]
+        np.subtract(values[1:], values[:-1], out=out[1:])
+    return out
+
+
+def track_from_coordinates(coordinates) -> Track:
+    """Build a Track from ``ActivityRouteCoordinate``-like objects."""
+    lat = np.fromiter((c.lat for c in coordinates), dtype=np.float64, count=len(coordinates))
+    lng = np.fromiter((c.lng for c in coordinates), dtype=np.float64, count=len(coordinates))
+
+    elevation = None
+    if any(c.elevation is not None for c in coordinates):
+        elevation = np.array(
+            [np.nan if c.elevation is None else c.elevation for c in coordinates],
+            dtype=np.float64
+        )
+
+    time = None
+    if any(c.timestamp is not None for c in coordinates):
+        ms = np.fromiter((_to_epoch_ms(c.timestamp) for c in coordinates), dtype=np.int64, count=len(coordinates))
+        time = ms.view("datetime64[ms]")
+
+    return Track(lat, lng, elevation, time)
+
+
+def encode_track(track: Track) -> bytes:
+    """Pack a Track into a compact blob."""
+    flags = 0
+    parts = [
+        _delta(np.round(np.asarray(track.lat) * COORD_SCALE).astype("<i4")),
+        _delta(np.round(np.asarray(track.lng) * COORD_SCALE).astype("<i4")),
+    ]
+
+    if track.elevation is not None:
+        flags |= FLAG_ELEVATION
+        elevation = np.asarray(track.elevation, dtype=np.float64)
+        missing = np.isnan(elevation)
+        centimeters = np.round(np.where(missing, 0, elevation) * ELEVATION_SCALE).astype("<i4")
+        centimeters[missing] = ELEVATION_MISSING
+        parts.append(_delta(centimeters))
+
+    if track.time is not None:
+        flags |= FLAG_TIME
+        parts.append(_delta(np.asarray(track.time).astype("datetime64[ms]").view("<i8")))
+
+    payload = b"".join(part.tobytes() for part in parts)
+    return HEADER.pack(MAGIC, VERSION, flags, len(track)) + zlib.compress(payload)
+
+
+def _decode_payload(payload: bytes, flags: int, count: int):
+    try:
+        raw = zlib.decompress(payload)
+    except zlib.error as e:
+        raise TrackDecodeError(f"Corrupt track payload: {e}")
+
+    expected = count * 8
+    if flags & FLAG_ELEVATION:
+        expected += count * 4
+    if flags & FLAG_TIME:
+        expected += count * 8
+    if len(raw) != expected:
+        raise TrackDecodeError("Track payload length does not match header")
+
+    offset = 0
+
+    def take(dtype):
+        nonlocal offset
+        column = np.frombuffer(raw, dtype=dtype, count=count, offset=offset)
+        offset += count * column.itemsize
+        return np.cumsum(column, dtype=column.dtype)
+
+    lat = take("<i4") / COORD_SCALE
+    lng = take("<i4") / COORD_SCALE
+
+    elevation = None
+    if flags & FLAG_ELEVATION:
+        centimeters = take("<i4")
+        elevation = np.where(centimeters == ELEVATION_MISSING, np.nan, centimeters / ELEVATION_SCALE)
+
+    time = None
+    if flags & FLAG_TIME:
+        time = take("<i8").view("datetime64[ms]")
+
+    return lat, lng, elevation, time
+
+
+def decode_track(blob: bytes) -> Track:
+    """Eagerly decode a packed blob."""
+    track = PackedTrack(blob)
+    return Track(track.lat, track.lng, track.elevation, track.time)
@@ -0,0 +1,197 @@
+"""Server-side heatmap of every point of a user's tracks.
+
+Points are binned into a ``height`` x ``width`` grid of equal-degree cells
+over the requested bounds (row 0 is the north edge) with one
+``np.bincount`` per batch of tracks, so the browser no longer needs every
+point to draw where a user has been.
+
+Built grids are kept in an in-process LRU per user, bounds and size,
+together with a fingerprint of each activity that went into them (point
+count, track version and track bounds). On the next request the fingerprints are
+compared with the database: when activities were only added, just their
+points are binned and added to the cached grid; when one was changed or
+deleted the grid is rebuilt from scratch. That comparison is one small
+query, so imports in other processes are picked up as well.
+"""
+
+import struct
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from config import settings
+from etags import current_data_version
+from models import Activity as ActivityModel
+from tracks.storage import load_tracks_at
+
+# Tracks loaded (and binned) per round trip
+LOAD_BATCH_SIZE = 200
+
+Bounds = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+Fingerprint = Tuple[Optional[float], ...]
+
+
+@dataclass(frozen=True)
+class Heatmap:
+    bounds: Bounds
+    counts: np.ndarray  # uint32, (height, width)
+    activities: Dict[int, Fingerprint]
+
+
+def bin_points(lat: np.ndarray, lng: np.ndarray, bounds: Bounds, width: int, height: int) -> np.ndarray:
+    """Point counts per cell as a flat row-major array of ``height * width``.
+
+    Points outside ``bounds`` are ignored; points on the east or south edge
+    fall into the last cell.
+    """
+    min_lat, min_lng, max_lat, max_lng = bounds
+    inside = (lat >= min_lat) & (lat <= max_lat) & (lng >= min_lng) & (lng <= max_lng)
+    rows = ((max_lat - lat[inside]) / (max_lat - min_lat) * height).astype(np.intp)
+    cols = ((lng[inside] - min_lng) / (max_lng - min_lng) * width).astype(np.intp)
+    np.minimum(rows, height - 1, out=rows)
+    np.minimum(cols, width - 1, out=cols)
+    return np.bincount(rows * width + cols, minlength=width * height)
+
+
+def _fingerprints(db: Session, user_id: int, bounds: Bounds) -> Dict[int, Fingerprint]:
+    """Point count, track version and track bounds of the user's activities
+    that may have points within ``bounds``."""
+    min_lat, min_lng, max_lat, max_lng = bounds
+    rows = db.query(
+        ActivityModel.id,
+        ActivityModel.track_points,
+        ActivityModel.track_version,
+        ActivityModel.min_lat,
+        ActivityModel.min_lng,
+        ActivityModel.max_lat,
+        ActivityModel.max_lng,
+    ).filter(
+        ActivityModel.user_id == user_id,
+        ActivityModel.track_points > 0,
+        # Tracks stored before bounds existed can't be ruled out
+        ActivityModel.min_lat.is_(None) | (
+            (ActivityModel.min_lat <= max_lat) & (ActivityModel.max_lat >= min_lat)
+            & (ActivityModel.min_lng <= max_lng) & (ActivityModel.max_lng >= min_lng)
+        )
+    ).all()
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+# What load_tracks_at needs of an activity
+_TrackKey = namedtuple("_TrackKey", "id track_points")
+
+
+def _bin_activities(db: Session, activities: Dict[int, Fingerprint], bounds: Bounds, width: int, height: int) -> np.ndarray:
+    counts = np.zeros(width * height, dtype=np.uint32)
+    keys = [_TrackKey(activity_id, fingerprint[0]) for activity_id, fingerprint in sorted(activities.items())]
+    for start in range(0, len(keys), LOAD_BATCH_SIZE):
+        tracks = load_tracks_at(db, keys[start:start + LOAD_BATCH_SIZE], None)
+        if tracks:
+            lat = np.concatenate([track.lat for track in tracks.values()])
+            lng = np.concatenate([track.lng for track in tracks.values()])
+            counts += bin_points(lat, lng, bounds, width, height).astype(np.uint32)
+    return counts.reshape(height, width)
+
+
+class HeatmapCache:
+    """Thread-safe LRU of built heatmaps with counters for ``/metrics``."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.incremental_updates = 0
+        self.full_builds = 0
+        self._entries: "OrderedDict[tuple, Heatmap]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[Heatmap]:
+        with self._lock:
+            heatmap = self._entries.get(key)
+            if heatmap is not None:
+                self._entries.move_to_end(key)
+            return heatmap
+
+    def set(self, key: tuple, heatmap: Heatmap) -> None:
+        with self._lock:
+            self._entries[key] = heatmap
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "incremental_updates": self.incremental_updates,
+            "full_builds": self.full_builds,
+        }
+
+
+heatmap_cache = HeatmapCache(settings.HEATMAP_CACHE_MAX_ENTRIES)
+
+
+def get_heatmap(db: Session, user_id: int, data_version: int, bounds: Bounds, width: int, height: int) -> Heatmap:
+    """The user's heatmap over ``bounds``, from the cache, updated or rebuilt.
+
+    As with tiles, a result is only cached if the user's data didn't change
+    while it was being built.
+    """
+    key = (user_id, bounds, width, height)
+    current = _fingerprints(db, user_id, bounds)
+    cached = heatmap_cache.get(key)
+
+    if cached is not None and cached.activities == current:
+        heatmap_cache.hits += 1
+        return cached
+    if cached is not None and all(current.get(activity_id) == fingerprint for activity_id, fingerprint in cached.activities.items()):
+        added = {activity_id: fingerprint for activity_id, fingerprint in current.items() if activity_id not in cached.activities}
+        heatmap = Heatmap(bounds, cached.counts + _bin_activities(db, added, bounds, width, height), current)
+        heatmap_cache.incremental_updates += 1
+    else:
+        heatmap = Heatmap(bounds, _bin_activities(db, current, bounds, width, height), current)
+        heatmap_cache.full_builds += 1
+
+    if current_data_version(db, user_id) == data_version:
+        heatmap_cache.set(key, heatmap)
+    return heatmap
+
+
+def heatmap_json(heatmap: Heatmap) -> dict:
+    """The grid as plain counts, row-major from the north-west corner."""
+    height, width = heatmap.counts.shape
+    return {
+        "bounds": list(heatmap.bounds),
+        "width": width,
+        "height": height,
+        "max": int(heatmap.counts.max(initial=0)),
+        "counts": heatmap.counts.ravel().tolist(),
+    }
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def heatmap_png(heatmap: Heatmap) -> bytes:
+    """The grid as an 8-bit grayscale PNG, log-scaled so sparse cells stay visible."""
+    height, width = heatmap.counts.shape
+    peak = heatmap.counts.max(initial=0)
+    scaled = np.log1p(heatmap.counts) / np.log1p(peak) * 255 if peak else np.zeros_like(heatmap.counts, dtype=float)
+    # Each scanline starts with filter type 0 (none)
+    raw = np.zeros((height, width + 1), dtype=np.uint8)
+    raw[:, 1:] = np.round(scaled).astype(np.uint8)
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)),
+        _png_chunk(b"IDAT", zlib.compress(raw.tobytes())),
+        _png_chunk(b"IEND", b""),
+    ))
@@ -0,0 +1,131 @@
+"""Create activities from uploaded GPX/TCX/FIT files."""
+
+from array import array
+from datetime import datetime, timezone
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from config import settings
+from etags import bump_data_version
+from formatting import format_pace, format_time_from_seconds, pace_seconds_per_km
+from models import Activity as ActivityModel, ActivityType
+from rollups import ActivityFacts, apply_rollups
+from tracks.codec import TIME_MISSING, Track, encode_track
+from tracks.parsers import TrackParseError, TrackPoint, iter_track_points
+from tracks.storage import TRACK_STORAGE_PACKED, insert_route_coordinates, save_track_lods, save_track_metrics
+
+# Points parsed, measured and written per step
+IMPORT_CHUNK_SIZE = 5000
+
+
+def _chunks(points: Iterable[TrackPoint], size: int) -> Iterator[List[TrackPoint]]:
+    iterator = iter(points)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _TrackBuffer:
+    """Accumulates points in compact typed arrays (~32 bytes/point)."""
+
+    def __init__(self):
+        self.lat = array("d")
+        self.lng = array("d")
+        self.elevation = array("d")
+        self.time = array("q")
+        self.has_elevation = False
+        self.has_time = False
+
+    def extend(self, chunk: List[TrackPoint]) -> None:
+        for point in chunk:
+            self.lat.append(point.lat)
+            self.lng.append(point.lng)
+            if point.elevation is None:
+                self.elevation.append(np.nan)
+            else:
+                self.elevation.append(point.elevation)
+                self.has_elevation = True
+            if point.timestamp is None:
+                self.time.append(TIME_MISSING)
+            else:
+                timestamp = point.timestamp
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=timezone.utc)
+                self.time.append(int(round(timestamp.timestamp() * 1000)))
+                self.has_time = True
+
+    def to_track(self) -> Track:
+        return Track(
+            np.frombuffer(self.lat, dtype=np.float64),
+            np.frombuffer(self.lng, dtype=np.float64),
+            np.frombuffer(self.elevation, dtype=np.float64) if self.has_elevation else None,
+            np.frombuffer(self.time, dtype=np.int64).view("datetime64[ms]") if self.has_time else None,
+        )
+
+
+def import_track(
+    db: Session,
+    user_id: int,
+    fileobj: BinaryIO,
+    fmt: str,
+    activity_type: ActivityType,
+    route: Optional[str] = None,
+    storage: Optional[str] = None
+) -> ActivityModel:
+    """Create an activity and its track from a GPX/TCX/FIT file.
+
+    Points are streamed from the parser in chunks of ``IMPORT_CHUNK_SIZE``;
+    each chunk is written straight to ``activity_routes`` in row storage
+    and appended to typed arrays that feed the packed blob, the levels of
+    detail and the track metrics. No parsed point objects outlive their
+    chunk. Distance, date, time and pace are derived from the track. The
+    caller owns the transaction.
+    """
+    storage = storage or settings.TRACK_STORAGE
+    db_activity = ActivityModel(
+        user_id=user_id,
+        date=datetime.now(timezone.utc),
+        distance=0.0,
+        route=route,
+        activity_type=activity_type,
+        track_points=0
+    )
+    db.add(db_activity)
+    db.flush()
+
+    points = 0
+    buffer = _TrackBuffer()
+    for chunk in _chunks(iter_track_points(fileobj, fmt), IMPORT_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if storage != TRACK_STORAGE_PACKED:
+            insert_route_coordinates(db, db_activity.id, chunk, start_index=points)
+        points += len(chunk)
+
+    if points == 0:
+        raise TrackParseError("No track points found in file")
+
+    track = buffer.to_track()
+    if storage == TRACK_STORAGE_PACKED:
+        db_activity.track_data = encode_track(track)
+    save_track_lods(db, db_activity.id, track)
+    save_track_metrics(db_activity, track)
+    db_activity.track_points = points
+    db_activity.distance = db_activity.track_distance
+    if track.time is not None:
+        times = track.time[~np.isnat(track.time)]
+        db_activity.date = times[0].astype(datetime).replace(tzinfo=timezone.utc)
+
+    elapsed = db_activity.elapsed_seconds
+    if elapsed:
+        db_activity.time = format_time_from_seconds(elapsed)
+        db_activity.pace = format_pace(db_activity.distance, elapsed)
+        db_activity.duration_seconds = elapsed
+        db_activity.pace_seconds_per_km = pace_seconds_per_km(db_activity.distance, elapsed)
+    bump_data_version(db, db_activity.user_id)
+    apply_rollups(db, added=[ActivityFacts.of(db_activity)])
+    return db_activity
@@ -0,0 +1,145 @@
+"""Vectorized geodesic helpers and derived metrics for GPS tracks.
+
+``compute_metrics`` turns a ``Track`` into the values stored on the
+activity at write time: distance, elevation gain/loss, elapsed and moving
+time, and per-kilometer splits. Everything except the final elevation
+hysteresis walk (which only visits turning points) is whole-array NumPy.
+"""
+
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+# Elevation changes smaller than this are treated as GPS/barometer noise
+ELEVATION_THRESHOLD_M = 3.0
+# Segments slower than this count as stopped for moving time (1.8 km/h)
+MOVING_SPEED_MPS = 0.5
+SPLIT_DISTANCE_M = 1000.0
+
+
+class TrackMetrics(NamedTuple):
+    distance_m: float
+    elevation_gain_m: Optional[float] = None
+    elevation_loss_m: Optional[float] = None
+    elapsed_seconds: Optional[int] = None
+    moving_seconds: Optional[int] = None
+    splits: Optional[List[float]] = None  # seconds per full kilometer
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters between arrays of points (degrees)."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def segment_distances_m(lat, lng):
+    """Distances in meters between consecutive points of a track."""
+    if len(lat) < 2:
+        return np.zeros(0)
+    return haversine_m(lat[:-1], lng[:-1], lat[1:], lng[1:])
+
+
+def cumulative_distance_m(lat, lng):
+    """Distance in meters from the first point to every point of a track."""
+    cumulative = np.zeros(len(lat))
+    np.cumsum(segment_distances_m(lat, lng), out=cumulative[1:])
+    return cumulative
+
+
+def _turning_points(values):
+    """Drop every point that lies inside a monotonic run."""
+    if len(values) < 3:
+        return values
+    diffs = np.diff(values)
+    nonflat = np.flatnonzero(diffs)
+    if len(nonflat) == 0:
+        return values[:1]
+    signs = np.sign(diffs[nonflat])
+    # A run ends where the sign of the next non-flat step changes
+    turns = nonflat[np.flatnonzero(signs[1:] != signs[:-1])] + 1
+    return values[np.concatenate(([0], turns, [nonflat[-1] + 1]))]
+
+
+def elevation_gain_loss(elevation, threshold: float = ELEVATION_THRESHOLD_M):
+    """Total climb and descent in meters, ignoring swings below ``threshold``.
+
+    A climb or descent is only counted once it reverses by at least
+    ``threshold``, so noise around a plateau adds nothing while a real
+    climb is counted in full. Missing (NaN) elevations are skipped.
+    """
+    elevation = np.asarray(elevation, dtype=np.float64)
+    points = _turning_points(elevation[~np.isnan(elevation)]).tolist()
+    if not points:
+        return 0.0, 0.0
+
+    gain = loss = 0.0
+    anchor = extreme = points[0]
+    climbing = None
+    for value in points[1:]:
+        if climbing is None:
+            if abs(value - anchor) >= threshold:
+                climbing = value > anchor
+                extreme = value
+        elif climbing:
+            if value > extreme:
+                extreme = value
+            elif extreme - value >= threshold:
+                gain += extreme - anchor
+                anchor, extreme, climbing = extreme, value, False
+        else:
+            if value < extreme:
+                extreme = value
+            elif value - extreme >= threshold:
+                loss += anchor - extreme
+                anchor, extreme, climbing = extreme, value, True
+
+    if climbing:
+        gain += extreme - anchor
+    elif climbing is False:
+        loss += anchor - extreme
+    return gain, loss
+
+
+def _seconds(time):
+    """datetime64 track times as float seconds, NaN where missing."""
+    seconds = time.astype("datetime64[ms]").astype(np.int64) / 1000.0
+    seconds[np.isnat(time)] = np.nan
+    return seconds
+
+
+def compute_metrics(track) -> TrackMetrics:
+    """Derive distance, elevation, timing and split metrics from a track."""
+    lat = np.asarray(track.lat, dtype=np.float64)
+    lng = np.asarray(track.lng, dtype=np.float64)
+    cumulative = cumulative_distance_m(lat, lng)
+    distance = float(cumulative[-1]) if len(cumulative) else 0.0
+    metrics = {"distance_m": distance}
+
+    if track.elevation is not None:
+        metrics["elevation_gain_m"], metrics["elevation_loss_m"] = elevation_gain_loss(track.elevation)
+
+    if track.time is not None:
+        seconds = _seconds(track.time)
+        timed = ~np.isnan(seconds)
+        if timed.sum() >= 2:
+            t = seconds[timed]
+            metrics["elapsed_seconds"] = int(round(t[-1] - t[0]))
+
+            # Only segments with a timestamp at both ends count towards moving time
+            dt = np.diff(seconds)
+            dd = np.diff(cumulative)
+            valid = ~np.isnan(dt) & (dt > 0)
+            moving = np.zeros_like(valid)
+            moving[valid] = dd[valid] / dt[valid] >= MOVING_SPEED_MPS
+            metrics["moving_seconds"] = int(round(dt[moving].sum()))
+
+            marks = np.arange(0.0, distance + 1e-9, SPLIT_DISTANCE_M)
+            if len(marks) > 1:
+                times_at = np.interp(marks, cumulative[timed], t)
+                metrics["splits"] = np.round(np.diff(times_at), 1).tolist()
+            else:
+                metrics["splits"] = []
+    return TrackMetrics(**metrics)
@@ -0,0 +1,263 @@
+"""Streaming parsers for GPX, TCX and FIT track files.
+
+Every parser is a generator over ``TrackPoint`` that reads its input
+incrementally: XML formats use ``iterparse`` and drop each point element
+as soon as it has been yielded, FIT files are read record by record. Memory
+use therefore does not grow with the size of the file.
+"""
+
+import os
+import struct
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+SUPPORTED_FORMATS = ("gpx", "tcx", "fit")
+
+
+class TrackParseError(ValueError):
+    """Raised when a track file cannot be parsed."""
+
+
+class TrackPoint(NamedTuple):
+    lat: float
+    lng: float
+    elevation: Optional[float] = None
+    timestamp: Optional[datetime] = None
+
+
+def detect_format(filename: Optional[str], fileobj: BinaryIO) -> str:
+    """Detect the track format from the file extension or its first bytes."""
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension in SUPPORTED_FORMATS:
+        return extension
+
+    head = fileobj.read(512)
+    fileobj.seek(0)
+    if len(head) >= 12 and head[8:12] == b".FIT":
+        return "fit"
+    if b"<gpx" in head:
+        return "gpx"
+    if b"TrainingCenterDatabase" in head:
+        return "tcx"
+    raise TrackParseError("Unsupported track file, expected GPX, TCX or FIT")
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise TrackParseError(f"Invalid timestamp: {value}")
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    if value is None or not value.strip():
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise TrackParseError(f"Invalid number: {value}")
+
+
+def _iter_xml_elements(fileobj: BinaryIO, point_tag: str) -> Iterator[ET.Element]:
+    """Yield complete ``point_tag`` elements, detaching each one afterwards."""
+    stack = []
+    try:
+        for event, elem in ET.iterparse(fileobj, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            if _local_name(elem.tag) == point_tag:
+                yield elem
+                # Drop the point so finished elements don't accumulate in the tree
+                elem.clear()
+                if stack:
+                    stack[-1].remove(elem)
+    except ET.ParseError as e:
+        raise TrackParseError(f"Invalid XML: {e}")
+
+
+def _child_text(elem: ET.Element, *path: str) -> Optional[str]:
+    for name in path:
+        for child in elem:
+            if _local_name(child.tag) == name:
+                elem = child
+                break
+        else:
+            return None
+    return elem.text
+
+
+def iter_gpx(fileobj: BinaryIO) -> Iterator[TrackPoint]:
+    """Yield the track points (``trkpt``) of a GPX file."""
+    for elem in _iter_xml_elements(fileobj, "trkpt"):
+        lat = _parse_float(elem.get("lat"))
+        lng = _parse_float(elem.get("lon"))
+        if lat is None or lng is None:
+            raise TrackParseError("GPX track point without lat/lon")
+        yield TrackPoint(
+            lat=lat,
+            lng=lng,
+            elevation=_parse_float(_child_text(elem, "ele")),
+            timestamp=_parse_time(_child_text(elem, "time"))
+        )
+
+
+def iter_tcx(fileobj: BinaryIO) -> Iterator[TrackPoint]:
+    """Yield the positioned track points (``Trackpoint``) of a TCX file."""
+    for elem in _iter_xml_elements(fileobj, "Trackpoint"):
+        lat = _parse_float(_child_text(elem, "Position", "LatitudeDegrees"))
+        lng = _parse_float(_child_text(elem, "Position", "LongitudeDegrees"))
+        if lat is None or lng is None:
+            # Indoor/paused samples carry no position
+            continue
+        yield TrackPoint(
+            lat=lat,
+            lng=lng,
+            elevation=_parse_float(_child_text(elem, "AltitudeMeters")),
+            timestamp=_parse_time(_child_text(elem, "Time"))
+        )
+
+
+# FIT protocol constants (see the FIT SDK profile)
+FIT_EPOCH = datetime(1989, 12, 31, tzinfo=timezone.utc)
+FIT_RECORD_MESG = 20
+FIT_FIELD_TIMESTAMP = 253
+FIT_FIELD_POSITION_LAT = 0
+FIT_FIELD_POSITION_LONG = 1
+FIT_FIELD_ALTITUDE = 2
+FIT_FIELD_ENHANCED_ALTITUDE = 78
+SEMICIRCLES_TO_DEGREES = 180.0 / 2 ** 31
+
+_FIT_INVALID = {
+    "b": 0x7F, "B": 0xFF, "h": 0x7FFF, "H": 0xFFFF,
+    "i": 0x7FFFFFFF, "I": 0xFFFFFFFF, "q": 0x7FFFFFFFFFFFFFFF, "Q": 0xFFFFFFFFFFFFFFFF,
+}
+# FIT base type number (low 5 bits) -> struct format for the numeric types we read
+_FIT_BASE_TYPES = {
+    0x00: "B", 0x01: "b", 0x02: "B", 0x03: "h", 0x04: "H", 0x05: "i", 0x06: "I",
+    0x0A: "B", 0x0B: "H", 0x0C: "I", 0x0E: "q", 0x0F: "Q", 0x10: "Q",
+}
+
+
+class _FitDefinition(NamedTuple):
+    global_num: int
+    endian: str
+    fields: list  # (field number, size, struct format or None)
+    size: int
+
+
+def _read_exact(fileobj: BinaryIO, size: int) -> bytes:
+    data = fileobj.read(size)
+    if len(data) != size:
+        raise TrackParseError("Truncated FIT file")
+    return data
+
+
+def iter_fit(fileobj: BinaryIO) -> Iterator[TrackPoint]:
+    """Yield positioned ``record`` messages of a FIT activity file."""
+    header = _read_exact(fileobj, 12)
+    header_size, _, _, data_size, signature = struct.unpack("<BBHI4s", header)
+    if signature != b".FIT" or header_size < 12:
+        raise TrackParseError("Not a FIT file")
+    _read_exact(fileobj, header_size - 12)
+
+    definitions = {}
+    last_timestamp = None
+    remaining = data_size
+
+    while remaining > 0:
+        record_header = _read_exact(fileobj, 1)[0]
+        remaining -= 1
+        time_offset = None
+
+        if record_header & 0x80:
+            # Compressed timestamp header: data message with a 5 bit time offset
+            local_num = (record_header >> 5) & 0x03
+            time_offset = record_header & 0x1F
+        elif record_header & 0x40:
+            local_num = record_header & 0x0F
+            fixed = _read_exact(fileobj, 5)
+            endian = ">" if fixed[1] else "<"
+            global_num = struct.unpack_from(endian + "H", fixed, 2)[0]
+            num_fields = fixed[4]
+            remaining -= 5
+
+            fields = []
+            for _ in range(num_fields):
+                number, size, base_type = _read_exact(fileobj, 3)
+                fmt = _FIT_BASE_TYPES.get(base_type & 0x1F)
+                if fmt and struct.calcsize("<" + fmt) != size:
+                    fmt = None
+                fields.append((number, size, fmt))
+            remaining -= 3 * num_fields
+
+            if record_header & 0x20:
+                num_dev_fields = _read_exact(fileobj, 1)[0]
+                dev_fields = _read_exact(fileobj, 3 * num_dev_fields)
+                fields.extend((None, dev_fields[i + 1], None) for i in range(0, len(dev_fields), 3))
+                remaining -= 1 + 3 * num_dev_fields
+
+            definitions[local_num] = _FitDefinition(
+                global_num, endian, fields, sum(size for _, size, _ in fields)
+            )
+            continue
+        else:
+            local_num = record_header & 0x0F
+
+        definition = definitions.get(local_num)
+        if definition is None:
+            raise TrackParseError("FIT data message without a definition")
+        data = _read_exact(fileobj, definition.size)
+        remaining -= definition.size
+
+        values = {}
+        offset = 0
+        for number, size, fmt in definition.fields:
+            if fmt is not None and number is not None:
+                value = struct.unpack_from(definition.endian + fmt, data, offset)[0]
+                if value != _FIT_INVALID[fmt]:
+                    values[number] = value
+            offset += size
+
+        if FIT_FIELD_TIMESTAMP in values:
+            last_timestamp = values[FIT_FIELD_TIMESTAMP]
+        elif time_offset is not None and last_timestamp is not None:
+            last_timestamp += (time_offset - (last_timestamp & 0x1F)) & 0x1F
+            values[FIT_FIELD_TIMESTAMP] = last_timestamp
+
+        if definition.global_num != FIT_RECORD_MESG:
+            continue
+        if FIT_FIELD_POSITION_LAT not in values or FIT_FIELD_POSITION_LONG not in values:
+            continue
+
+        altitude = values.get(FIT_FIELD_ENHANCED_ALTITUDE, values.get(FIT_FIELD_ALTITUDE))
+        timestamp = values.get(FIT_FIELD_TIMESTAMP)
+        yield TrackPoint(
+            lat=values[FIT_FIELD_POSITION_LAT] * SEMICIRCLES_TO_DEGREES,
+            lng=values[FIT_FIELD_POSITION_LONG] * SEMICIRCLES_TO_DEGREES,
+            elevation=altitude / 5.0 - 500.0 if altitude is not None else None,
+            timestamp=FIT_EPOCH + timedelta(seconds=timestamp) if timestamp is not None else None
+        )
+
+
+_PARSERS = {
+    "gpx": iter_gpx,
+    "tcx": iter_tcx,
+    "fit": iter_fit,
+}
+
+
+def iter_track_points(fileobj: BinaryIO, fmt: str) -> Iterator[TrackPoint]:
+    """Stream the points of a track file in the given format."""
+    parser = _PARSERS.get(fmt)
+    if parser is None:
+        raise TrackParseError(f"Unsupported track format: {fmt}")
+    return parser(fileobj)
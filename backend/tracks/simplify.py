@@ -0,0 +1,92 @@
+"""Track simplification for map views.
+
+Tracks are simplified with Douglas-Peucker on a local equirectangular
+projection, so tolerances are in meters. The split search is iterative and
+each segment's distance scan is a single vectorized NumPy pass.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from tracks.codec import Track
+from tracks.metrics import EARTH_RADIUS_M
+
+# Precomputed levels of detail: name -> tolerance in meters, finest first
+LOD_LEVELS = {
+    "high": 2.0,
+    "medium": 10.0,
+    "low": 50.0,
+}
+
+
+def project_m(lat, lng):
+    """Project degrees to local planar meters around the track's mean latitude."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    cos_lat0 = np.cos(np.radians(lat.mean())) if len(lat) else 1.0
+    return (
+        EARTH_RADIUS_M * np.radians(lng) * cos_lat0,
+        EARTH_RADIUS_M * np.radians(lat),
+    )
+
+
+def douglas_peucker(x, y, tolerance: float) -> np.ndarray:
+    """Return a boolean mask of the points Douglas-Peucker keeps."""
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n <= 2:
+        keep[:] = True
+        return keep
+
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        xs = x[start + 1:end] - x[start]
+        ys = y[start + 1:end] - y[start]
+        dx = x[end] - x[start]
+        dy = y[end] - y[start]
+        length2 = dx * dx + dy * dy
+        if length2 == 0:
+            distances = np.hypot(xs, ys)
+        else:
+            # Distance to the segment, not the infinite line, so loops aren't dropped
+            t = np.clip((xs * dx + ys * dy) / length2, 0.0, 1.0)
+            distances = np.hypot(xs - t * dx, ys - t * dy)
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def simplify_track(track: Track, tolerance: float) -> Track:
+    """Simplify a track to within ``tolerance`` meters."""
+    x, y = project_m(track.lat, track.lng)
+    keep = douglas_peucker(x, y, tolerance)
+    return Track(
+        track.lat[keep],
+        track.lng[keep],
+        track.elevation[keep] if track.elevation is not None else None,
+        track.time[keep] if track.time is not None else None,
+    )
+
+
+def level_for_tolerance(tolerance: Optional[float]) -> Optional[str]:
+    """The coarsest stored level whose tolerance doesn't exceed ``tolerance``.
+
+    Returns None when the full-resolution track is needed.
+    """
+    best = None
+    if tolerance:
+        for name, level_tolerance in LOD_LEVELS.items():
+            if level_tolerance <= tolerance:
+                best = name
+    return best
@@ -0,0 +1,337 @@
+"""Reading and writing activity tracks.
+
+Tracks are stored either as one ``activity_routes`` row per point ("rows")
+or as a single packed blob on the activity ("packed", see ``tracks.codec``).
+``settings.TRACK_STORAGE`` picks the mode for new writes; reads handle both.
+"""
+
+from datetime import datetime, timezone
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Activity as ActivityModel, ActivityRoute as ActivityRouteModel, ActivityTrackLOD as ActivityTrackLODModel
+from tracks.codec import PackedTrack, Track, encode_track, track_from_coordinates
+from tracks.metrics import compute_metrics
+from tracks.simplify import LOD_LEVELS, level_for_tolerance, simplify_track
+
+TRACK_STORAGE_ROWS = "rows"
+TRACK_STORAGE_PACKED = "packed"
+
+
+def _naive_utc(timestamp: Optional[datetime]) -> Optional[datetime]:
+    """``timestamp`` as naive UTC, how both storage modes keep times."""
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def route_rows(activity_id: int, coordinates, start_index: int = 0) -> List[dict]:
+    """Build ``activity_routes`` parameter rows for a bulk INSERT."""
+    return [
+        {
+            "activity_id": activity_id,
+            "latitude": coord.lat,
+            "longitude": coord.lng,
+            "elevation": coord.elevation,
+            "timestamp": _naive_utc(coord.timestamp),
+            "order_index": i,
+        }
+        for i, coord in enumerate(coordinates, start_index)
+    ]
+
+
+def insert_route_coordinates(db: Session, activity_id: int, coordinates, start_index: int = 0) -> int:
+    """Bulk insert route coordinates for an activity.
+
+    All points are sent as a single executemany INSERT instead of one ORM
+    object per point. ``start_index`` offsets ``order_index`` when a track
+    is written in several chunks. The caller owns the transaction.
+    """
+    if not coordinates:
+        return 0
+
+    db.execute(insert(ActivityRouteModel), route_rows(activity_id, coordinates, start_index))
+    return len(coordinates)
+
+
+def lod_rows(activity_id: int, track: Track) -> List[dict]:
+    """Simplify a track to each of ``LOD_LEVELS`` and build bulk INSERT rows.
+
+    Levels that would not drop any point are skipped; reads fall back to
+    the next finer level or the full track.
+    """
+    rows = []
+    for level, tolerance in LOD_LEVELS.items():
+        simplified = simplify_track(track, tolerance)
+        if len(simplified) >= len(track):
+            continue
+        rows.append({
+            "activity_id": activity_id,
+            "level": level,
+            "tolerance": tolerance,
+            "point_count": len(simplified),
+            "track_data": encode_track(simplified),
+        })
+    return rows
+
+
+def save_track_lods(db: Session, activity_id: int, track: Optional[Track]) -> None:
+    """Replace the precomputed levels of detail of an activity's track."""
+    db.query(ActivityTrackLODModel).filter(
+        ActivityTrackLODModel.activity_id == activity_id
+    ).delete(synchronize_session=False)
+    if track is not None and len(track):
+        rows = lod_rows(activity_id, track)
+        if rows:
+            db.execute(insert(ActivityTrackLODModel), rows)
+
+
+def track_metric_values(track: Optional[Track]) -> dict:
+    """Activity column values derived from a track (metrics and bounding box), all None without one."""
+    if track is None or not len(track):
+        return {
+            "track_distance": None,
+            "elevation_gain": None,
+            "elevation_loss": None,
+            "elapsed_seconds": None,
+            "moving_seconds": None,
+            "splits": None,
+            "min_lat": None,
+            "min_lng": None,
+            "max_lat": None,
+            "max_lng": None,
+        }
+
+    metrics = compute_metrics(track)
+    return {
+        "track_distance": round(metrics.distance_m / 1000, 3),
+        "elevation_gain": round(metrics.elevation_gain_m, 1) if metrics.elevation_gain_m is not None else None,
+        "elevation_loss": round(metrics.elevation_loss_m, 1) if metrics.elevation_loss_m is not None else None,
+        "elapsed_seconds": metrics.elapsed_seconds,
+        "moving_seconds": metrics.moving_seconds,
+        "splits": metrics.splits,
+        "min_lat": float(np.min(track.lat)),
+        "min_lng": float(np.min(track.lng)),
+        "max_lat": float(np.max(track.lat)),
+        "max_lng": float(np.max(track.lng)),
+    }
+
+
+def save_track_metrics(activity: ActivityModel, track: Optional[Track]) -> None:
+    """Store the metrics derived from ``track`` on the activity."""
+    for column, value in track_metric_values(track).items():
+        setattr(activity, column, value)
+
+
+def delete_track(db: Session, activity: ActivityModel) -> None:
+    """Remove any stored track for an activity, in either storage mode."""
+    if activity.track_points:
+        db.query(ActivityRouteModel).filter(
+            ActivityRouteModel.activity_id == activity.id
+        ).delete(synchronize_session=False)
+        db.query(ActivityTrackLODModel).filter(
+            ActivityTrackLODModel.activity_id == activity.id
+        ).delete(synchronize_session=False)
+    activity.track_data = None
+    activity.track_points = 0
+    save_track_metrics(activity, None)
+
+
+def save_track(db: Session, activity: ActivityModel, coordinates, storage: Optional[str] = None) -> None:
+    """Replace the track of a flushed activity, its levels of detail and metrics.
+
+    The caller owns the transaction.
+    """
+    storage = storage or settings.TRACK_STORAGE
+    delete_track(db, activity)
+    activity.track_version = (activity.track_version or 0) + 1
+    if not coordinates:
+        return
+
+    track = track_from_coordinates(coordinates)
+    if storage == TRACK_STORAGE_PACKED:
+        activity.track_data = encode_track(track)
+    else:
+        insert_route_coordinates(db, activity.id, coordinates)
+    activity.track_points = len(coordinates)
+    save_track_lods(db, activity.id, track)
+    save_track_metrics(activity, track)
+
+
+def _rows_to_track(rows) -> Track:
+    lat, lng, elevation, timestamp = zip(*rows)
+    track = Track(np.array(lat, dtype=np.float64), np.array(lng, dtype=np.float64))
+    if any(e is not None for e in elevation):
+        track.elevation = np.array([np.nan if e is None else e for e in elevation], dtype=np.float64)
+    if any(t is not None for t in timestamp):
+        track.time = np.array(
+            [np.datetime64("NaT") if t is None else np.datetime64(t.replace(tzinfo=None), "ms") for t in timestamp],
+            dtype="datetime64[ms]"
+        )
+    return track
+
+
+def _load_rows(db: Session, activity_id: int) -> Optional[Track]:
+    rows = db.query(
+        ActivityRouteModel.latitude,
+        ActivityRouteModel.longitude,
+        ActivityRouteModel.elevation,
+        ActivityRouteModel.timestamp,
+    ).filter(
+        ActivityRouteModel.activity_id == activity_id
+    ).order_by(ActivityRouteModel.order_index).all()
+
+    if not rows:
+        return None
+    return _rows_to_track(rows)
+
+
+def _load_full_tracks(db: Session, activity_ids: List[int]) -> Dict[int, Track]:
+    """Full tracks of several activities with one query per storage mode."""
+    tracks = {
+        activity_id: PackedTrack(blob)
+        for activity_id, blob in db.query(ActivityModel.id, ActivityModel.track_data).filter(
+            ActivityModel.id.in_(activity_ids),
+            ActivityModel.track_data.isnot(None)
+        )
+    }
+    remaining = [activity_id for activity_id in activity_ids if activity_id not in tracks]
+    if remaining:
+        rows = db.query(
+            ActivityRouteModel.activity_id,
+            ActivityRouteModel.latitude,
+            ActivityRouteModel.longitude,
+            ActivityRouteModel.elevation,
+            ActivityRouteModel.timestamp,
+        ).filter(
+            ActivityRouteModel.activity_id.in_(remaining)
+        ).order_by(ActivityRouteModel.activity_id, ActivityRouteModel.order_index).all()
+        for activity_id, points in groupby(rows, key=itemgetter(0)):
+            tracks[activity_id] = _rows_to_track([point[1:] for point in points])
+    return tracks
+
+
+def load_track(db: Session, activity: ActivityModel) -> Optional[Track]:
+    """Load an activity's track.
+
+    Packed tracks are returned undecoded; the arrays are only materialized
+    when one of them is first accessed.
+    """
+    if activity.track_data is not None:
+        return PackedTrack(activity.track_data)
+    return _load_rows(db, activity.id)
+
+
+def load_tracks_at(db: Session, activities: Iterable[ActivityModel], tolerance: Optional[float]) -> Dict[int, Track]:
+    """Load the tracks of several activities simplified to ``tolerance`` meters.
+
+    Precomputed levels for all activities are fetched with one query; only
+    activities without a suitable level fall back to their full track, which
+    are batch-loaded with one query per storage mode rather than one per
+    activity.
+    """
+    activities = [a for a in activities if a.track_points]
+    level = level_for_tolerance(tolerance)
+    tracks = {}
+    if level is not None and activities:
+        acceptable = [name for name in LOD_LEVELS if LOD_LEVELS[name] <= LOD_LEVELS[level]]
+        rows = db.query(
+            ActivityTrackLODModel.activity_id,
+            ActivityTrackLODModel.tolerance,
+            ActivityTrackLODModel.track_data,
+        ).filter(
+            ActivityTrackLODModel.activity_id.in_([a.id for a in activities]),
+            ActivityTrackLODModel.level.in_(acceptable)
+        ).all()
+        best = {}
+        for activity_id, level_tolerance, blob in rows:
+            if activity_id not in best or level_tolerance > best[activity_id][0]:
+                best[activity_id] = (level_tolerance, blob)
+        tracks = {activity_id: PackedTrack(blob) for activity_id, (_, blob) in best.items()}
+
+    missing = [a.id for a in activities if a.id not in tracks]
+    if missing:
+        tracks.update(_load_full_tracks(db, missing))
+    return tracks
+
+
+def build_missing_lods(db: Session, batch_size: int = 100) -> int:
+    """Backfill: compute levels of detail for tracks stored before they existed.
+
+    Returns the number of activities processed.
+    """
+    processed = 0
+    last_id = 0
+    while True:
+        activities = db.query(ActivityModel).filter(
+            ActivityModel.id > last_id,
+            ActivityModel.track_points > 0,
+            ~ActivityModel.track_lods.any()
+        ).order_by(ActivityModel.id).limit(batch_size).all()
+        if not activities:
+            return processed
+
+        for activity in activities:
+            save_track_lods(db, activity.id, load_track(db, activity))
+            processed += 1
+        last_id = activities[-1].id
+        db.commit()
+
+
+def compute_missing_metrics(db: Session, batch_size: int = 100) -> int:
+    """Backfill: derive metrics for tracks stored before they were computed.
+
+    Returns the number of activities processed.
+    """
+    processed = 0
+    last_id = 0
+    while True:
+        activities = db.query(ActivityModel).filter(
+            ActivityModel.id > last_id,
+            ActivityModel.track_points > 0,
+            ActivityModel.track_distance.is_(None) | ActivityModel.min_lat.is_(None)
+        ).order_by(ActivityModel.id).limit(batch_size).all()
+        if not activities:
+            return processed
+
+        for activity in activities:
+            save_track_metrics(activity, load_track(db, activity))
+            processed += 1
+        last_id = activities[-1].id
+        db.commit()
+
+
+def pack_existing_tracks(db: Session, batch_size: int = 100) -> int:
+    """Backfill: move row-stored tracks into packed blobs.
+
+    Commits every ``batch_size`` activities so the backfill can be
+    interrupted and resumed. Returns the number of activities packed.
+    """
+    packed = 0
+    while True:
+        activity_ids = [
+            activity_id for (activity_id,) in db.query(ActivityRouteModel.activity_id).join(
+                ActivityModel, ActivityModel.id == ActivityRouteModel.activity_id
+            ).filter(
+                ActivityModel.track_data.is_(None)
+            ).distinct().limit(batch_size).all()
+        ]
+        if not activity_ids:
+            return packed
+
+        for activity_id in activity_ids:
+            activity = db.get(ActivityModel, activity_id)
+            track = _load_rows(db, activity_id)
+            db.query(ActivityRouteModel).filter(
+                ActivityRouteModel.activity_id == activity_id
+            ).delete(synchronize_session=False)
+            activity.track_data = encode_track(track)
+            activity.track_points = len(track)
+            packed += 1
+        db.commit()
@@ -0,0 +1,293 @@
+"""GeoJSON map tiles of a user's tracks.
+
+Tiles use the usual Web Mercator z/x/y scheme. A tile holds one
+MultiLineString feature per activity crossing it: only the track segments
+whose bounding box meets the tile (plus a small buffer) are kept, tracks
+come from the coarsest stored level of detail finer than a pixel at that
+zoom, and coordinates are rounded to about a pixel so points that collapse
+together are dropped.
+
+Built tiles are cached on disk under ``TILE_CACHE_DIR/<user>/<z>/<x>/<y>.json``.
+Empty tiles are not stored: they are one shared constant body. Each user's
+tiles are kept within ``TILE_CACHE_MAX_BYTES_PER_USER``, least recently
+used first out; the order is tracked in process and starts from the files'
+modification times. Writers call ``invalidate_tiles`` with the bounds of
+the activities they changed after committing; only the cached tiles
+overlapping those bounds are removed.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from config import settings
+from etags import current_data_version
+from models import Activity as ActivityModel
+from serialization import dumps
+from tracks.simplify import LOD_LEVELS, simplify_track
+from tracks.codec import Track
+from tracks.storage import load_tracks_at
+
+MAX_ZOOM = 20
+TILE_SIZE_PX = 256
+# Segments this fraction of a tile outside it are kept so lines cross tile edges cleanly
+TILE_BUFFER = 1 / 16
+# Meters per pixel at zoom 0 on the equator
+_EQUATOR_M_PER_PX = 2 * math.pi * 6378137.0 / TILE_SIZE_PX
+_MAX_LATITUDE = 85.0511287798
+
+Bounds = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Bounds:
+    """The (south, west, north, east) bounds of a tile in degrees."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def tile_range(z: int, bounds: Bounds) -> Tuple[int, int, int, int]:
+    """The (x_min, y_min, x_max, y_max) tiles covering ``bounds`` at zoom ``z``."""
+    n = 2 ** z
+
+    def column(lng):
+        return min(n - 1, max(0, int((lng + 180.0) / 360.0 * n)))
+
+    def row(lat):
+        lat = math.radians(max(-_MAX_LATITUDE, min(_MAX_LATITUDE, lat)))
+        return min(n - 1, max(0, int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)))
+
+    min_lat, min_lng, max_lat, max_lng = bounds
+    return column(min_lng), row(max_lat), column(max_lng), row(min_lat)
+
+
+def pixel_size_m(z: int, lat: float) -> float:
+    return _EQUATOR_M_PER_PX * math.cos(math.radians(lat)) / 2 ** z
+
+
+def activity_bounds(activity) -> Optional[Bounds]:
+    """An activity's track bounds, or None when it has no track."""
+    if activity.min_lat is None:
+        return None
+    return activity.min_lat, activity.min_lng, activity.max_lat, activity.max_lng
+
+
+def clip_runs(lat: np.ndarray, lng: np.ndarray, bounds: Bounds) -> List[slice]:
+    """Slices of the runs of consecutive segments whose bounding box meets ``bounds``."""
+    if len(lat) < 2:
+        return []
+    south, west, north, east = bounds
+    meets = (
+        (np.minimum(lat[:-1], lat[1:]) <= north) & (np.maximum(lat[:-1], lat[1:]) >= south)
+        & (np.minimum(lng[:-1], lng[1:]) <= east) & (np.maximum(lng[:-1], lng[1:]) >= west)
+    )
+    # Edges of the runs of kept segments; a run of segments i..j spans points i..j+1
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], meets.view(np.int8), [0]))))
+    return [slice(start, end + 1) for start, end in zip(edges[::2], edges[1::2])]
+
+
+def _line(track: Track, run: slice, decimals: int, tolerance: float) -> list:
+    part = Track(track.lat[run], track.lng[run])
+    if tolerance > max(LOD_LEVELS.values()):
+        part = simplify_track(part, tolerance)
+    points = np.column_stack((np.round(part.lng, decimals), np.round(part.lat, decimals)))
+    # Drop points that round onto the previous one
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+    points = points[keep]
+    if len(points) < 2:
+        # Smaller than a pixel: keep it as a dot
+        points = points[[0, 0]]
+    return points.tolist()
+
+
+def build_tile(db: Session, user_id: int, z: int, x: int, y: int) -> dict:
+    """The GeoJSON FeatureCollection of ``user_id``'s tracks within a tile."""
+    south, west, north, east = tile_bounds(z, x, y)
+    pad_lat = (north - south) * TILE_BUFFER
+    pad_lng = (east - west) * TILE_BUFFER
+    clip = (south - pad_lat, west - pad_lng, north + pad_lat, east + pad_lng)
+
+    activities = db.query(
+        ActivityModel.id, ActivityModel.track_points, ActivityModel.activity_type
+    ).filter(
+        ActivityModel.user_id == user_id,
+        ActivityModel.track_points > 0,
+        ActivityModel.min_lat <= clip[2],
+        ActivityModel.max_lat >= clip[0],
+        ActivityModel.min_lng <= clip[3],
+        ActivityModel.max_lng >= clip[1]
+    ).order_by(ActivityModel.id).all()
+
+    tolerance = pixel_size_m(z, (south + north) / 2)
+    # Round to roughly a pixel's worth of degrees
+    decimals = max(0, min(7, math.ceil(-math.log10((east - west) / TILE_SIZE_PX))))
+    tracks = load_tracks_at(db, activities, tolerance)
+
+    features = []
+    for activity in activities:
+        track = tracks.get(activity.id)
+        if track is None:
+            continue
+        lines = [_line(track, run, decimals, tolerance) for run in clip_runs(track.lat, track.lng, clip)]
+        if lines:
+            features.append({
+                "type": "Feature",
+                "id": activity.id,
+                "geometry": {"type": "MultiLineString", "coordinates": lines},
+                "properties": {"activity_type": activity.activity_type},
+            })
+    return {"type": "FeatureCollection", "features": features}
+
+
+# What a tile without any track in it looks like; served without touching the disk
+EMPTY_TILE = dumps({"type": "FeatureCollection", "features": []})
+
+
+def _user_dir(user_id: int) -> str:
+    return os.path.join(settings.TILE_CACHE_DIR, str(user_id))
+
+
+def _tile_path(user_id: int, z: int, x: int, y: int) -> str:
+    return os.path.join(_user_dir(user_id), str(z), str(x), f"{y}.json")
+
+
+# Cached tile paths per user directory, least recently used first, with their sizes
+_lru: Dict[str, "OrderedDict[str, int]"] = {}
+_lru_bytes: Dict[str, int] = {}
+_lru_lock = threading.Lock()
+
+
+def _user_lru(user_dir: str) -> "OrderedDict[str, int]":
+    """The LRU of a user's cached tiles, loaded oldest first from disk on first use.
+
+    The caller holds ``_lru_lock``.
+    """
+    lru = _lru.get(user_dir)
+    if lru is None:
+        found = []
+        for root, _, names in os.walk(user_dir):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    found.append((stat.st_mtime, path, stat.st_size))
+        lru = _lru[user_dir] = OrderedDict((path, size) for _, path, size in sorted(found))
+        _lru_bytes[user_dir] = sum(lru.values())
+    return lru
+
+
+def _use_tile(user_id: int, path: str, size: int) -> List[str]:
+    """Mark a cached tile most recently used; returns the tiles to evict."""
+    user_dir = _user_dir(user_id)
+    evict = []
+    with _lru_lock:
+        lru = _user_lru(user_dir)
+        _lru_bytes[user_dir] += size - lru.pop(path, 0)
+        lru[path] = size
+        # Never evict the tile just used
+        while _lru_bytes[user_dir] > settings.TILE_CACHE_MAX_BYTES_PER_USER and len(lru) > 1:
+            old_path, old_size = lru.popitem(last=False)
+            _lru_bytes[user_dir] -= old_size
+            evict.append(old_path)
+    return evict
+
+
+def _forget_tile(user_id: int, path: str) -> None:
+    user_dir = _user_dir(user_id)
+    with _lru_lock:
+        if user_dir in _lru:
+            _lru_bytes[user_dir] -= _lru[user_dir].pop(path, 0)
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def get_tile(db: Session, user_id: int, data_version: int, z: int, x: int, y: int) -> bytes:
+    """A tile's GeoJSON body, from the disk cache or freshly built.
+
+    A built tile is only cached if the user's data didn't change while it
+    was being built (``data_version`` is the version the request started
+    with), so a concurrent write can't leave a stale tile behind. Empty
+    tiles are never written, so scanning empty parts of the map doesn't
+    fill the disk.
+    """
+    path = _tile_path(user_id, z, x, y)
+    try:
+        with open(path, "rb") as f:
+            body = f.read()
+        _use_tile(user_id, path, len(body))
+        return body
+    except FileNotFoundError:
+        pass
+
+    tile = build_tile(db, user_id, z, x, y)
+    if not tile["features"]:
+        return EMPTY_TILE
+    body = dumps(tile)
+    if current_data_version(db, user_id) == data_version:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial tile
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        for evicted in _use_tile(user_id, path, len(body)):
+            _remove(evicted)
+    return body
+
+
+def invalidate_tiles(user_id: int, bounds: Iterable[Optional[Bounds]]) -> int:
+    """Remove the cached tiles of ``user_id`` overlapping any of ``bounds``.
+
+    Returns the number of tiles removed.
+    """
+    bounds = [b for b in bounds if b is not None]
+    root = _user_dir(user_id)
+    if not bounds or not os.path.isdir(root):
+        return 0
+
+    removed = 0
+    for z_entry in os.scandir(root):
+        if not z_entry.name.isdigit():
+            continue
+        z = int(z_entry.name)
+        ranges = [tile_range(z, b) for b in bounds]
+        for x_entry in os.scandir(z_entry.path):
+            x = int(x_entry.name)
+            rows = [(y_min, y_max) for x_min, y_min, x_max, y_max in ranges if x_min <= x <= x_max]
+            if not rows:
+                continue
+            for y_entry in os.scandir(x_entry.path):
+                name, ext = os.path.splitext(y_entry.name)
+                if ext == ".json" and any(y_min <= int(name) <= y_max for y_min, y_max in rows):
+                    _forget_tile(user_id, y_entry.path)
+                    removed += _remove(y_entry.path)
+    return removed
+
+
+def clear_tiles(user_id: Optional[int] = None) -> None:
+    """Remove every cached tile, of one user or of everyone."""
+    path = _user_dir(user_id) if user_id is not None else settings.TILE_CACHE_DIR
+    shutil.rmtree(path, ignore_errors=True)
+    with _lru_lock:
+        for user_dir in [d for d in _lru if d == path or d.startswith(path + os.sep)]:
+            del _lru[user_dir], _lru_bytes[user_dir]